@@ -0,0 +1,152 @@
+﻿"""Точное распределение выплат без Монте-Карло.
+
+Исход колонки в resolve_column зависит только от первой сверху кирки и
+от того, как UP2/TNT меняют силу. Оба бонуса - аффинные преобразования
+(x -> 2x, x -> x + 10), поэтому итоговая сила имеет вид P * 2^u + b, и
+состояние (кирка, u, b) полностью описывает колонку. DP по строкам -
+app.column_state_dp, та же, что строит alias-таблицу OutcomeTable;
+сундук дает множитель, равномерный на CHEST_MULTS. Спин - свертка cfg.cols
+независимых колонок. Считается для текущего game_config.json или для
+файла из --config.
+
+    python -m analytic          # сводка
+    python -m analytic --json   # полное распределение
+    python -m analytic --exact  # в дробях вместо float
+    python -m analytic --config game_config.large.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Callable, Dict, Optional, Tuple
+
+from app import CHEST_MULTS, CONFIG, GameConfig, column_state_dp, dig, load_config
+
+State = Tuple[str, int, int]  # (кирка или "", u, b)
+
+
+@dataclass
+class ColumnDistribution:
+    reward: Dict[int, object]            # награда колонки -> вероятность
+    base_pickaxe: Dict[str, object]
+    depth: Dict[int, object]
+    chest_prob: object
+
+
+@dataclass
+class SpinDistribution:
+    column: ColumnDistribution
+    reward: Dict[int, object]            # выигрыш за спин -> вероятность
+    mean: float
+    variance: float
+    hit_frequency: float
+    rtp: float
+
+
+def column_states(num: Callable = float, cfg: Optional[GameConfig] = None) -> Dict[State, object]:
+    # вероятности (кирка, u, b) из последнего слоя общей DP; колонки без
+    # кирки (base < 0) уже учтены ремонтом
+    cfg = cfg or CONFIG
+    out: Dict[State, object] = defaultdict(int)
+    for (_, (base, u, b)), edges in column_state_dp(cfg, num)[-1].items():
+        if base >= 0:
+            out[(cfg.symbol_ids[base], u, b)] += sum(e[2] for e in edges)
+    return out
+
+
+def column_distribution(num: Callable = float, cfg: Optional[GameConfig] = None) -> ColumnDistribution:
+    cfg = cfg or CONFIG
+    reward: Dict[int, object] = defaultdict(int)
+    base: Dict[str, object] = defaultdict(int)
+    depth: Dict[int, object] = defaultdict(int)
+    chest = num(0)
+    for (pick, u, b), p in column_states(num, cfg).items():
+        d, raw, broke, _ = dig(cfg.pickaxes[pick]["power"] * 2 ** u + b, cfg.blocks)
+        base[pick] += p
+        depth[d] += p
+        if broke:
+            chest += p
+            for m in CHEST_MULTS:
+                reward[raw * m] += p / len(CHEST_MULTS)
+        else:
+            reward[raw] += p
+    return ColumnDistribution(
+        reward=dict(sorted(reward.items())),
+        base_pickaxe=dict(base),
+        depth=dict(sorted(depth.items())),
+        chest_prob=chest,
+    )
+
+
+def convolve(a: Dict[int, object], b: Dict[int, object]) -> Dict[int, object]:
+    out: Dict[int, object] = defaultdict(int)
+    for x, p in a.items():
+        for y, q in b.items():
+            out[x + y] += p * q
+    return dict(sorted(out.items()))
+
+
+def spin_distribution(num: Callable = float, bet: float = 1.0, cfg: Optional[GameConfig] = None) -> SpinDistribution:
+    cfg = cfg or CONFIG
+    col = column_distribution(num, cfg)
+    reward: Dict[int, object] = {0: num(1)}
+    for _ in range(cfg.cols):
+        reward = convolve(reward, col.reward)
+    mean = sum(x * p for x, p in reward.items())
+    variance = sum(x * x * p for x, p in reward.items()) - mean * mean
+    return SpinDistribution(
+        column=col,
+        reward=reward,
+        mean=float(mean),
+        variance=float(variance),
+        hit_frequency=float(1 - reward.get(0, 0)),
+        rtp=float(mean) / bet,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m analytic")
+    parser.add_argument("--bet", type=float, default=1.0, help="ставка для расчета RTP")
+    parser.add_argument("--exact", action="store_true", help="считать в дробях")
+    parser.add_argument("--json", action="store_true", help="вывести распределения в JSON")
+    parser.add_argument("--config", default=None, help="файл конфига игры (по умолчанию текущий)")
+    args = parser.parse_args()
+
+    cfg = load_config(args.config) if args.config else CONFIG
+    t0 = time.perf_counter()
+    dist = spin_distribution(Fraction if args.exact else float, args.bet, cfg)
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    if args.json:
+        col = dist.column
+        print(json.dumps({
+            "mean": dist.mean,
+            "variance": dist.variance,
+            "hit_frequency": dist.hit_frequency,
+            "rtp": dist.rtp,
+            "column": {
+                "reward": {k: float(v) for k, v in col.reward.items()},
+                "base_pickaxe": {k: float(v) for k, v in col.base_pickaxe.items()},
+                "depth": {k: float(v) for k, v in col.depth.items()},
+                "chest_prob": float(col.chest_prob),
+            },
+            "spin_reward": {k: float(v) for k, v in dist.reward.items()},
+        }, indent=2))
+        return
+
+    print(f"средний выигрыш за спин: {dist.mean:.6f}")
+    print(f"RTP (ставка {args.bet:g}): {dist.rtp:.6f}")
+    print(f"дисперсия: {dist.variance:.4f}  (σ = {math.sqrt(dist.variance):.4f})")
+    print(f"частота выигрыша: {dist.hit_frequency:.6f}")
+    print(f"сундук в колонке: {float(dist.column.chest_prob):.6f}")
+    print(f"расчет: {elapsed:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
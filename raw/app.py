@@ -1,48 +1,64 @@
-﻿from __future__ import annotations
+from __future__ import annotations
 
+import hashlib
+import hmac
 import json
+import logging
+import os
 import random
-from dataclasses import dataclass
-from typing import List, Tuple
-
-from flask import Flask, jsonify, render_template_string, session
-
-app = Flask(__name__)
-app.secret_key = "change-me-please"
+import struct
+import threading
+import time
+import uuid
+import zlib
+from bisect import bisect
+from itertools import accumulate
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, session
+from jinja2 import Environment
+
+from assets import CACHE_CONTROL, AssetStore
+from audit import AuditLayout, AuditLog
+from fair import FairRandom, commitment, open_fair_seeds
+from leaderboard import Leaderboard
+from metrics import Metrics
+from profiling import RouteProfiler
+from store import PerProcess, open_store
+
+log = logging.getLogger(__name__)
+
+# memory - только для одного процесса; для нескольких воркеров sqlite:///scores.db.
+# Открываются при первом обращении в каждом процессе: соединения SQLite и
+# фоновые потоки не переживают fork из мастера с preload.
+score_store = PerProcess(lambda: open_store(os.environ.get("SCORE_STORE", "memory")))
+# сиды provably fair лежат там же, где счет
+fair_seeds = PerProcess(lambda: open_fair_seeds(os.environ.get("SCORE_STORE", "memory")))
+# рейтинг игроков; с SQLite дочитывает счета всех воркеров из score_store
+leaderboard = PerProcess(lambda: Leaderboard(score_store, os.environ.get("LEADERBOARD_SNAPSHOT")))
+# счетчики /metrics; с METRICS_DIR суммируются по всем воркерам
+metrics = PerProcess(lambda: Metrics(os.environ.get("METRICS_DIR")))
 
 
 # ---------------------------
 # Game config
 # ---------------------------
 
-REELS_ROWS = 5
-REELS_COLS = 5
-
-PICKAXES = {
-    "WOOD": {"label": "WOOD x2", "mult": 2, "power": 10},
-    "STONE": {"label": "STONE x4", "mult": 4, "power": 16},
-    "IRON": {"label": "IRON x8", "mult": 8, "power": 24},
-    "DIAMOND": {"label": "DIAMOND x12", "mult": 12, "power": 32},
-}
-
-SYMBOLS: List[Tuple[str, int]] = [
-    ("WOOD", 28),
-    ("STONE", 20),
-    ("IRON", 12),
-    ("DIAMOND", 6),
-    ("UP2", 10),
-    ("TNT", 8),
-    ("EMPTY", 16),
-]
-
-BLOCKS = [
-    {"id": "DIRT", "name": "Земля", "hardness": 3, "reward": 0},
-    {"id": "STONE", "name": "Камень", "hardness": 4, "reward": 1},
-    {"id": "ORE", "name": "Руда", "hardness": 5, "reward": 2},
-    {"id": "GOLD", "name": "Золото", "hardness": 6, "reward": 3},
-    {"id": "DIAM", "name": "Алмаз", "hardness": 7, "reward": 4},
-    {"id": "CHEST", "name": "Сундук", "hardness": 4, "reward": 0},
-]
+# геометрия, кирки, символы и слои читаются из JSON (см. game_config.json)
+CONFIG_PATH = os.environ.get("GAME_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_config.json"))
+# как часто (секунды) проверять mtime файла конфига
+CONFIG_CHECK_INTERVAL = 1.0
+
+# максимум спинов в одном запросе /spin/batch
+MAX_BATCH_SPINS = 10_000
+# спинов в одной части потока /spin/batch: одно приращение счета на часть
+BATCH_CHUNK_SPINS = 100
+# /autoplay: максимум спинов в потоке и пауза между ними
+MAX_AUTOPLAY_SPINS = 1000
+MAX_AUTOPLAY_INTERVAL_MS = 60_000
+# множитель сундука равномерен на этом диапазоне; его используют скалярный
+# путь, OutcomeTable, batch.py и analytic.py
+CHEST_MULTS = range(1, 11)
 
 
 def weighted_pick(symbols: List[Tuple[str, int]]) -> str:
@@ -56,17 +72,35 @@ def weighted_pick(symbols: List[Tuple[str, int]]) -> str:
     return symbols[-1][0]
 
 
-def generate_reels() -> List[List[str]]:
-    reels = [[weighted_pick(SYMBOLS) for _ in range(REELS_COLS)] for _ in range(REELS_ROWS)]
-    # гарантируем: в каждой колонке есть хотя бы 1 кирка
-    for c in range(REELS_COLS):
-        if not any(reels[r][c] in PICKAXES for r in range(REELS_ROWS)):
-            reels[random.randrange(REELS_ROWS)][c] = random.choice(list(PICKAXES.keys()))
-    return reels
+class SymbolSampler:
+    # таблица накопленных весов собирается один раз, выбор символа - bisect
+    def __init__(self, symbols: List[Tuple[str, int]]):
+        self.symbols = tuple(s for s, _ in symbols)
+        self.codes = range(len(self.symbols))
+        self.cum_weights = tuple(accumulate(w for _, w in symbols))
+        self.total = self.cum_weights[-1]
+
+    def pick(self, rng: random.Random) -> str:
+        return self.symbols[bisect(self.cum_weights, rng.random() * self.total)]
+
+    def draw_grid(self, rows: int, cols: int, rng: random.Random) -> List[List[str]]:
+        flat = rng.choices(self.symbols, cum_weights=self.cum_weights, k=rows * cols)
+        return [flat[r * cols:(r + 1) * cols] for r in range(rows)]
+
+    def draw_code_grid(self, rows: int, cols: int, rng: random.Random) -> bytearray:
+        # сетка построчно, по байту (коду символа) на клетку
+        return bytearray(rng.choices(self.codes, cum_weights=self.cum_weights, k=rows * cols))
+
+    def draw_codes(self, shape, gen):
+        # коды символов (индексы в self.symbols) из numpy.random.Generator
+        import numpy as np
 
+        cum = np.asarray(self.cum_weights, dtype=np.int64)
+        r = gen.integers(1, self.total, size=shape, endpoint=True)
+        return np.searchsorted(cum, r).astype(np.uint8)
 
-@dataclass
-class ColumnResult:
+
+class ColumnResult(NamedTuple):
     base_pickaxe: str
     final_power: int
     depth_reached: int
@@ -74,67 +108,498 @@ class ColumnResult:
     chest_mult: int
     raw_reward: int
     final_reward: int
+    # RLE-события копки для анимации: (индекс блока, ударов, сломан)
+    events: Tuple[Tuple[int, int, int], ...] = ()
 
 
-def resolve_column(col_syms: List[str]) -> ColumnResult:
-    base = None
-    for s in col_syms:
-        if s in PICKAXES:
-            base = s
-            break
-    if base is None:
-        base = "WOOD"
-
-    power = PICKAXES[base]["power"]
+class DigOutcome(NamedTuple):
+    depth_reached: int
+    raw_reward: int
+    reaches_chest: bool
+    leftover: int
 
-    for s in col_syms:
-        if s == "UP2":
-            power *= 2
-        elif s == "TNT":
-            power += 10
 
+def dig(power: int, blocks: List[dict]) -> DigOutcome:
     raw_reward = 0
     depth = 0
-    chest_mult = 1
-    broke_chest = False
-
-    for i, b in enumerate(BLOCKS):
+    for i, b in enumerate(blocks):
         if power < b["hardness"]:
             break
         power -= b["hardness"]
         depth = i + 1
         raw_reward += b["reward"]
+        if b["id"] == "CHEST":
+            return DigOutcome(depth, raw_reward, True, power)
+    return DigOutcome(depth, raw_reward, False, power)
 
+
+def build_dig_table(blocks: List[dict]) -> List[DigOutcome]:
+    # выше суммарной прочности исход не меняется, растет только остаток силы,
+    # поэтому таблица покрывает 0..cap, а большие силы прижимаются к cap
+    cap = 0
+    for b in blocks:
+        cap += b["hardness"]
         if b["id"] == "CHEST":
-            broke_chest = True
-            chest_mult = random.randint(1, 10)
             break
+    return [dig(p, blocks) for p in range(cap + 1)]
+
+
+def dig_events(power: int, blocks: List[dict]) -> Tuple[Tuple[int, int, int], ...]:
+    # то же, что dig(), но по блокам: сломанные блоки целиком, на последнем
+    # кирка тратит остаток силы, не пробивая его
+    events = []
+    for i, b in enumerate(blocks):
+        if power < b["hardness"]:
+            if power > 0:
+                events.append((i, power, 0))
+            break
+        power -= b["hardness"]
+        events.append((i, b["hardness"], 1))
+        if b["id"] == "CHEST":
+            break
+    return tuple(events)
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _positive_int(value, what: str) -> int:
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise ConfigError(f"{what} must be a positive integer")
+    return value
+
+
+def _object(value, what: str) -> dict:
+    if not isinstance(value, dict):
+        raise ConfigError(f"{what} must be an object")
+    return value
+
+
+def validate_config(raw: dict) -> None:
+    _object(raw, "config")
+    reels = _object(raw.get("reels", {}), "reels")
+    _positive_int(reels.get("rows"), "reels.rows")
+    _positive_int(reels.get("cols"), "reels.cols")
+
+    pickaxes = raw.get("pickaxes")
+    if not isinstance(pickaxes, dict) or not pickaxes:
+        raise ConfigError("pickaxes must be a non-empty object")
+    for pid, p in pickaxes.items():
+        _object(p, f"pickaxes.{pid}")
+        _positive_int(p.get("power"), f"pickaxes.{pid}.power")
+        _positive_int(p.get("mult"), f"pickaxes.{pid}.mult")
+        if not isinstance(p.get("label"), str):
+            raise ConfigError(f"pickaxes.{pid}.label must be a string")
+
+    symbols = raw.get("symbols")
+    if not isinstance(symbols, list) or not 0 < len(symbols) <= 256:
+        raise ConfigError("symbols must be a list of 1..256 entries")
+    for i, s in enumerate(symbols):
+        _object(s, f"symbols[{i}]")
+    ids = [s.get("id") for s in symbols]
+    if not all(isinstance(s, str) for s in ids) or len(set(ids)) != len(ids):
+        raise ConfigError("symbol ids must be unique strings")
+    for s in symbols:
+        _positive_int(s.get("weight"), f"symbols.{s['id']}.weight")
+    missing = [p for p in pickaxes if p not in ids]
+    if missing:
+        raise ConfigError(f"pickaxes without a symbol: {', '.join(missing)}")
+
+    blocks = raw.get("blocks")
+    if not isinstance(blocks, list) or not blocks:
+        raise ConfigError("blocks must be a non-empty list")
+    for i, b in enumerate(blocks):
+        _object(b, f"blocks[{i}]")
+    bids = [b.get("id") for b in blocks]
+    if not all(isinstance(b, str) for b in bids) or len(set(bids)) != len(bids):
+        raise ConfigError("block ids must be unique strings")
+    for b in blocks:
+        _positive_int(b.get("hardness"), f"blocks.{b['id']}.hardness")
+        if not isinstance(b.get("reward"), int) or b["reward"] < 0:
+            raise ConfigError(f"blocks.{b['id']}.reward must be a non-negative integer")
+        if not isinstance(b.get("name"), str):
+            raise ConfigError(f"blocks.{b['id']}.name must be a string")
+
+
+def _symbol_kind(sym: str, pickaxes: dict) -> str:
+    if sym in pickaxes:
+        return "pick"
+    return {"UP2": "up", "TNT": "tnt"}.get(sym, "empty")
+
+
+class GameConfig:
+    # все, что нужно горячему пути, собирается один раз на версию конфига.
+    # Запрос берет ссылку на конфиг один раз (current_config) и работает только
+    # с ней, поэтому подмена конфига посреди спина ничего не смешивает.
+    def __init__(self, raw: dict):
+        validate_config(raw)
+        self.raw = raw
+        self.version = hashlib.sha1(json.dumps(raw, sort_keys=True).encode()).hexdigest()[:12]
+
+        self.rows = raw["reels"]["rows"]
+        self.cols = raw["reels"]["cols"]
+        self.pickaxes = raw["pickaxes"]
+        self.symbols: List[Tuple[str, int]] = [(s["id"], s["weight"]) for s in raw["symbols"]]
+        self.blocks: List[dict] = raw["blocks"]
+
+        self.sampler = SymbolSampler(self.symbols)
+        self.symbol_ids = self.sampler.symbols
+        self.symbol_codes = {s: i for i, s in enumerate(self.symbol_ids)}
+        self.pickaxe_ids = tuple(self.pickaxes)
+        self.pickaxe_codes = tuple(self.symbol_codes[p] for p in self.pickaxe_ids)
+        # код символа -> сила кирки, 0 для не-кирок
+        self.code_power = tuple(self.pickaxes[s]["power"] if s in self.pickaxes else 0 for s in self.symbol_ids)
+        self.up2_code = self.symbol_codes.get("UP2", -1)
+        self.tnt_code = self.symbol_codes.get("TNT", -1)
+
+        # сила -> исход копки; размер таблицы не зависит от числа строк и колонок
+        self.dig_table = build_dig_table(self.blocks)
+        self.dig_cap = len(self.dig_table) - 1
+        self.dig_events = [dig_events(p, self.blocks) for p in range(self.dig_cap + 1)]
+
+        self.blocks_json = json.dumps(self.blocks, ensure_ascii=False)
+        # константы клиента: JS ничего не хардкодит
+        self.client_json = json.dumps({
+            "version": self.version,
+            "rows": self.rows,
+            "cols": self.cols,
+            "pickaxes": list(self.pickaxe_ids),
+            "symbols": [
+                {"id": s["id"], "label": s.get("label", s["id"]), "kind": _symbol_kind(s["id"], self.pickaxes)}
+                for s in raw["symbols"]
+            ],
+            "blocks": self.blocks,
+        }, ensure_ascii=False).replace("</", "<\\/")
+
+        self._index_page: Optional[IndexPage] = None
+        self._audit_layout: Optional[AuditLayout] = None
+        self._outcomes: Optional[OutcomeTable] = None
+        self._config_url: Optional[str] = None
+
+    @property
+    def index_page(self) -> "IndexPage":
+        if self._index_page is None:
+            self._index_page = IndexPage(INDEX_TEMPLATE.render(total_score=IndexPage.SCORE_MARKER, cfg=self, assets=static_assets))
+        return self._index_page
+
+    @property
+    def config_url(self) -> str:
+        # константы клиента - отдельный ассет с хэшем, чтобы их не тянула каждая страница
+        if self._config_url is None:
+            self._config_url = static_assets.add("config.js", f"window.GAME_CONFIG = {self.client_json};\n".encode("utf-8"))
+        return self._config_url
+
+    @property
+    def audit_layout(self) -> AuditLayout:
+        if self._audit_layout is None:
+            self._audit_layout = AuditLayout(self.rows, self.cols, self.symbol_ids, self.pickaxe_ids, self.blocks)
+        return self._audit_layout
+
+    @property
+    def outcomes(self) -> "OutcomeTable":
+        # таблица исходов колонки для спинов без символов, строится при первом обращении
+        if self._outcomes is None:
+            self._outcomes = OutcomeTable(self)
+        return self._outcomes
+
+
+def load_config(path: str) -> GameConfig:
+    with open(path, encoding="utf-8") as f:
+        return GameConfig(json.load(f))
+
+
+def _config_stamp(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+CONFIG = load_config(CONFIG_PATH)
+_config_stamp_seen = _config_stamp(CONFIG_PATH)
+_config_next_check = time.monotonic() + CONFIG_CHECK_INTERVAL
+_config_lock = threading.Lock()
+
+
+def reload_config(force: bool = False) -> bool:
+    # новый конфиг собирается целиком и подменяется одним присваиванием;
+    # битый файл пишется в лог, а игра продолжает на старом конфиге
+    global CONFIG, _config_stamp_seen
+    with _config_lock:
+        try:
+            stamp = _config_stamp(CONFIG_PATH)
+        except OSError:
+            return False
+        if stamp == _config_stamp_seen and not force:
+            return False
+        _config_stamp_seen = stamp
+        try:
+            cfg = load_config(CONFIG_PATH)
+        except (OSError, ValueError) as e:
+            log.error("game config %s rejected: %s", CONFIG_PATH, e)
+            return False
+        if cfg.version == CONFIG.version:
+            return False
+        try:
+            # шаблон рендерится до подмены, а не первым запросом; раскладка аудита
+            # тоже: конфиг, который не влезает в запись аудита (AuditLayout), отклоняется
+            # здесь, а не в settle_spin после зачисления выигрыша
+            cfg.index_page
+            if audit_log:
+                cfg.audit_layout
+        except ValueError as e:
+            log.error("game config %s rejected: %s", CONFIG_PATH, e)
+            return False
+        CONFIG = cfg
+        log.info("game config %s loaded, version %s", CONFIG_PATH, cfg.version)
+        return True
+
+
+def current_config() -> GameConfig:
+    global _config_next_check
+    now = time.monotonic()
+    if now >= _config_next_check:
+        _config_next_check = now + CONFIG_CHECK_INTERVAL
+        reload_config()
+    return CONFIG
+
+
+# свой генератор на процесс; после fork переинициализируем, чтобы воркеры не повторяли друг друга
+spin_rng = random.Random()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=spin_rng.seed)
+
+# журнал аудита спинов включается переменной AUDIT_DIR (каталог сегментов)
+audit_log: Optional[AuditLog] = None
+if os.environ.get("AUDIT_DIR"):
+    audit_log = PerProcess(lambda: AuditLog(os.environ["AUDIT_DIR"]))
+
+
+def generate_reel_codes(rng: Optional[random.Random] = None, cfg: Optional[GameConfig] = None) -> bytearray:
+    rng = rng or spin_rng
+    cfg = cfg or CONFIG
+    rows, cols, code_power = cfg.rows, cfg.cols, cfg.code_power
+    codes = cfg.sampler.draw_code_grid(rows, cols, rng)
+    # гарантируем: в каждой колонке есть хотя бы 1 кирка
+    for c in range(cols):
+        if not any(code_power[x] for x in codes[c::cols]):
+            codes[rng.randrange(rows) * cols + c] = cfg.pickaxe_codes[rng.randrange(len(cfg.pickaxe_codes))]
+    return codes
+
+
+def decode_reels(codes: bytes, cfg: Optional[GameConfig] = None) -> List[List[str]]:
+    cfg = cfg or CONFIG
+    ids, cols = cfg.symbol_ids, cfg.cols
+    return [[ids[x] for x in codes[r * cols:(r + 1) * cols]] for r in range(cfg.rows)]
+
+
+def generate_reels(rng: Optional[random.Random] = None, cfg: Optional[GameConfig] = None) -> List[List[str]]:
+    cfg = cfg or CONFIG
+    return decode_reels(generate_reel_codes(rng, cfg), cfg)
+
+
+def resolve_column_codes(col: Sequence[int], rng: Optional[random.Random] = None,
+                         cfg: Optional[GameConfig] = None) -> ColumnResult:
+    cfg = cfg or CONFIG
+    code_power = cfg.code_power
+    base = None
+    for x in col:
+        if code_power[x]:
+            base = x
+            break
+    if base is None:
+        base = cfg.pickaxe_codes[0]
+
+    power = code_power[base]
+
+    up2, tnt = cfg.up2_code, cfg.tnt_code
+    for x in col:
+        if x == up2:
+            power *= 2
+        elif x == tnt:
+            power += 10
+
+    cap = cfg.dig_cap
+    if power > cap:
+        depth, raw_reward, broke_chest, leftover = cfg.dig_table[cap]
+        leftover += power - cap
+        events = cfg.dig_events[cap]
+    else:
+        depth, raw_reward, broke_chest, leftover = cfg.dig_table[power]
+        events = cfg.dig_events[power]
+
+    chest_mult = (rng or spin_rng).randint(CHEST_MULTS[0], CHEST_MULTS[-1]) if broke_chest else 1
+
+    return ColumnResult(cfg.symbol_ids[base], leftover, depth, broke_chest, chest_mult, raw_reward, raw_reward * chest_mult, events)
+
 
-    final_reward = raw_reward * chest_mult
-    return ColumnResult(
-        base_pickaxe=base,
-        final_power=power,
-        depth_reached=depth,
-        broke_chest=broke_chest,
-        chest_mult=chest_mult,
-        raw_reward=raw_reward,
-        final_reward=final_reward,
-    )
+def resolve_column(col_syms: List[str], rng: Optional[random.Random] = None, cfg: Optional[GameConfig] = None) -> ColumnResult:
+    cfg = cfg or CONFIG
+    return resolve_column_codes([cfg.symbol_codes[s] for s in col_syms], rng, cfg)
 
 
-def resolve_spin(reels: List[List[str]]) -> Tuple[List[ColumnResult], int]:
+def resolve_spin_codes(codes: bytes, rng: Optional[random.Random] = None,
+                       cfg: Optional[GameConfig] = None) -> Tuple[List[ColumnResult], int]:
+    cfg = cfg or CONFIG
+    cols = cfg.cols
     results: List[ColumnResult] = []
     total = 0
-    for c in range(REELS_COLS):
-        col = [reels[r][c] for r in range(REELS_ROWS)]
-        res = resolve_column(col)
+    for c in range(cols):
+        res = resolve_column_codes(codes[c::cols], rng, cfg)
         results.append(res)
         total += res.final_reward
     return results, total
 
 
+def resolve_spin(reels: List[List[str]], rng: Optional[random.Random] = None,
+                 cfg: Optional[GameConfig] = None) -> Tuple[List[ColumnResult], int]:
+    cfg = cfg or CONFIG
+    return resolve_spin_codes(bytes(cfg.symbol_codes[s] for row in reels for s in row), rng, cfg)
+
+
+# ---------------------------
+# Outcome-level sampling (без символов)
+# ---------------------------
+
+OutcomeState = Tuple[int, int, int]  # (код первой кирки или -1, число UP2, сдвиг от TNT)
+OutcomeNode = Tuple[int, OutcomeState]  # (компонента: -1 - колонка как выпала, r - ремонт строки r; состояние)
+OutcomeEdges = Dict[OutcomeNode, List[Tuple[OutcomeNode, int, object]]]
+
+
+def column_state_dp(cfg: GameConfig, num: Callable = float) -> List[OutcomeEdges]:
+    # Исход колонки зависит только от первой кирки и от того, как UP2/TNT
+    # меняют силу: сила = P * 2^u + b, поэтому состояние (кирка, u, b)
+    # полностью описывает колонку. Прямой проход по строкам с учетом весов
+    # символов и ремонта колонки без кирки из generate_reel_codes.
+    # Для каждой строки t: узел после строки -> [(узел до строки, код, вес пути)];
+    # вероятность узла - сумма весов его ребер. num=Fraction дает точные дроби.
+    rows = cfg.rows
+    total = sum(w for _, w in cfg.symbols)
+    probs = [num(w) / total for _, w in cfg.symbols]
+    code_power, up2, tnt = cfg.code_power, cfg.up2_code, cfg.tnt_code
+    non_pick = [c for c in range(len(probs)) if not code_power[c]]
+    repair = sum(probs[c] for c in non_pick) / (rows * len(cfg.pickaxe_codes))
+
+    def step(state: OutcomeState, c: int) -> OutcomeState:
+        base, u, b = state
+        if code_power[c]:
+            return (c if base < 0 else base, u, b)
+        if c == up2:
+            return (base, u + 1, b * 2)
+        if c == tnt:
+            return (base, u, b + 10)
+        return state
+
+    start: OutcomeState = (-1, 0, 0)
+    layer = {(comp, start): num(1) for comp in range(-1, rows)}
+    out: List[OutcomeEdges] = []
+    for t in range(rows):
+        edges: OutcomeEdges = {}
+        for node, w in layer.items():
+            comp, state = node
+            if comp < 0:
+                moves = [(c, probs[c]) for c in range(len(probs))]
+            elif comp == t:
+                # исходный символ строки теряется, на его место встает случайная кирка
+                moves = [(k, repair) for k in cfg.pickaxe_codes]
+            else:
+                moves = [(c, probs[c]) for c in non_pick]
+            for c, p in moves:
+                edges.setdefault((comp, step(state, c)), []).append((node, c, w * p))
+        layer = {node: sum(e[2] for e in es) for node, es in edges.items()}
+        out.append(edges)
+    return out
+
+
+class OutcomeTable:
+    # Вероятности состояний колонки берутся из column_state_dp; одинаковые
+    # ColumnResult (с множителем сундука) склеиваются в одну запись
+    # alias-таблицы: колонка без символов - одна выборка.
+    # Символы при необходимости восстанавливаются обратным проходом по той
+    # же DP: колонка выбирается из условного распределения при данном исходе.
+    def __init__(self, cfg: GameConfig):
+        code_power = cfg.code_power
+        dp = column_state_dp(cfg)
+        # back[t][узел после строки t] -> ([(узел до строки t, код строки t)], накопленные веса)
+        self._back: List[dict] = [{node: ([(prev, c) for prev, c, _ in es], tuple(accumulate(e[2] for e in es)))
+                                   for node, es in edges.items()} for edges in dp]
+        layer = {node: sum(e[2] for e in es) for node, es in dp[-1].items()}
+
+        # колонки без кирки (компонента -1, base < 0) уже учтены ремонтом
+        by_result: dict = {}
+        for node, w in layer.items():
+            base, u, b = node[1]
+            if base < 0:
+                continue
+            power = code_power[base] * 2 ** u + b
+            cap = min(power, cfg.dig_cap)
+            depth, raw_reward, broke_chest, leftover = cfg.dig_table[cap]
+            leftover += power - cap
+            for m in (CHEST_MULTS if broke_chest else (1,)):
+                r = ColumnResult(cfg.symbol_ids[base], leftover, depth, broke_chest, m, raw_reward, raw_reward * m, cfg.dig_events[cap])
+                by_result.setdefault(r, []).append((node, w / len(CHEST_MULTS) if broke_chest else w))
+
+        self.results: Tuple[ColumnResult, ...] = tuple(by_result)
+        weights = [sum(w for _, w in nodes) for nodes in by_result.values()]
+        self.prob, self.alias = _alias_table(weights)
+        self._n = len(self.results)
+        # исход -> узлы последней строки, из которых он получается
+        self._finals = [([node for node, _ in nodes], tuple(accumulate(w for _, w in nodes))) for nodes in by_result.values()]
+
+    def column(self, rng: random.Random) -> int:
+        # индекс исхода в self.results; одно число из rng
+        u = rng.random() * self._n
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+    def spin(self, rng: random.Random, cols: int) -> Tuple[List[int], List[ColumnResult], int]:
+        outcomes = [self.column(rng) for _ in range(cols)]
+        results = [self.results[i] for i in outcomes]
+        return outcomes, results, sum(r.final_reward for r in results)
+
+    def reconstruct(self, outcome: int, rng: random.Random) -> bytearray:
+        # коды символов колонки сверху вниз, согласованные с исходом
+        nodes, cum = self._finals[outcome]
+        node = nodes[bisect(cum, rng.random() * cum[-1])] if len(nodes) > 1 else nodes[0]
+        col = bytearray(len(self._back))
+        for t in reversed(range(len(self._back))):
+            prev, cum = self._back[t][node]
+            node, col[t] = prev[bisect(cum, rng.random() * cum[-1])] if len(prev) > 1 else prev[0]
+        return col
+
+
+def _alias_table(weights: List[float]) -> Tuple[List[float], List[int]]:
+    # метод Vose: prob[i] - доля ячейки i, остальное отдается alias[i]
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob, alias = [1.0] * n, list(range(n))
+    small = [i for i, x in enumerate(scaled) if x < 1.0]
+    large = [i for i, x in enumerate(scaled) if x >= 1.0]
+    while small and large:
+        s, g = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], g
+        scaled[g] -= 1.0 - scaled[s]
+        (small if scaled[g] < 1.0 else large).append(g)
+    return prob, alias
+
+
+def sample_outcome_spin(rng: Optional[random.Random] = None, cfg: Optional[GameConfig] = None,
+                        reels: bool = False) -> Tuple[Optional[bytearray], List[ColumnResult], int]:
+    # спин без генерации сетки; с reels=True сетка восстанавливается по исходам
+    cfg = cfg or CONFIG
+    rng = rng or spin_rng
+    table = cfg.outcomes
+    outcomes, results, gain = table.spin(rng, cfg.cols)
+    if not reels:
+        return None, results, gain
+    codes = bytearray(cfg.rows * cfg.cols)
+    for c, i in enumerate(outcomes):
+        codes[c::cfg.cols] = table.reconstruct(i, rng)
+    return codes, results, gain
+
+
 # ---------------------------
-# HTML template (Jinja, no Python f-string)
+# HTML shell (Jinja, no Python f-string); CSS и JS - в static/
 # ---------------------------
 
 INDEX_HTML = r"""<!doctype html>
@@ -143,167 +608,23 @@ INDEX_HTML = r"""<!doctype html>
   <meta charset="utf-8"/>
   <meta name="viewport" content="width=device-width, initial-scale=1"/>
   <title>Pickaxe Slot Miner</title>
-  <style>
-    :root {
-      --bg: #0f1220;
-      --panel: #171a2e;
-      --cell: #23264a;
-      --text: #e7e7ff;
-      --muted: #a6a6d6;
-      --good: #8ef0a1;
-      --warn: #ffd37a;
-    }
-    body {
-      margin: 0;
-      background: radial-gradient(1200px 700px at 20% 10%, #1b1f3a, var(--bg));
-      color: var(--text);
-      font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Arial, "Noto Sans", "Liberation Sans", sans-serif;
-    }
-    .wrap {
-      max-width: 980px;
-      margin: 0 auto;
-      padding: 16px;
-      display: grid;
-      gap: 12px;
-    }
-    .topbar {
-      display: flex;
-      gap: 12px;
-      align-items: center;
-      justify-content: space-between;
-      background: rgba(255,255,255,0.04);
-      border: 1px solid rgba(255,255,255,0.08);
-      border-radius: 14px;
-      padding: 12px 14px;
-    }
-    .score {
-      font-weight: 800;
-      letter-spacing: 0.2px;
-    }
-    .btn {
-      cursor: pointer;
-      border: 0;
-      background: linear-gradient(180deg, #3a7bfd, #2a57f5);
-      color: white;
-      font-weight: 900;
-      padding: 10px 14px;
-      border-radius: 12px;
-      min-width: 160px;
-    }
-    .btn:disabled {
-      opacity: 0.6;
-      cursor: not-allowed;
-    }
-    .board {
-      background: rgba(255,255,255,0.04);
-      border: 1px solid rgba(255,255,255,0.08);
-      border-radius: 14px;
-      padding: 14px;
-      display: grid;
-      gap: 14px;
-    }
-
-    .reels {
-      display: grid;
-      grid-template-columns: repeat(5, 1fr);
-      gap: 8px;
-    }
-    .col {
-      background: var(--panel);
-      border: 1px solid rgba(255,255,255,0.10);
-      border-radius: 12px;
-      padding: 8px;
-      display: grid;
-      gap: 6px;
-    }
-    .cell {
-      height: 42px;
-      border-radius: 10px;
-      background: var(--cell);
-      display: grid;
-      place-items: center;
-      font-weight: 900;
-      font-size: 12px;
-      user-select: none;
-      border: 1px solid rgba(255,255,255,0.07);
-    }
-    .cell.small { font-size: 11px; font-weight: 900; }
-
-    .tag-pick { color: #cfe3ff; }
-    .tag-up { color: var(--good); }
-    .tag-tnt { color: #ff8aa0; }
-    .tag-empty { color: rgba(255,255,255,0.35); }
-
-    .canvasWrap {
-      background: rgba(255,255,255,0.04);
-      border: 1px solid rgba(255,255,255,0.08);
-      border-radius: 14px;
-      padding: 12px;
-    }
-
-    canvas {
-      width: 100%;
-      height: auto;
-      display: block;
-      border-radius: 12px;
-      background: #121532;
-      border: 1px solid rgba(255,255,255,0.10);
-    }
-
-    .log {
-      background: var(--panel);
-      border: 1px solid rgba(255,255,255,0.10);
-      border-radius: 12px;
-      padding: 12px;
-      display: grid;
-      gap: 8px;
-    }
-    .row {
-      display: flex;
-      gap: 10px;
-      flex-wrap: wrap;
-      align-items: center;
-      justify-content: space-between;
-    }
-    .pill {
-      background: rgba(255,255,255,0.06);
-      border: 1px solid rgba(255,255,255,0.10);
-      border-radius: 999px;
-      padding: 6px 10px;
-      font-weight: 900;
-      font-size: 12px;
-      color: var(--muted);
-    }
-    .gain {
-      font-weight: 900;
-      color: var(--warn);
-    }
-    .hint {
-      color: rgba(255,255,255,0.55);
-      font-size: 12px;
-      line-height: 1.35;
-    }
-  </style>
+  <link rel="stylesheet" href="{{ assets.url('game.css') }}"/>
+  <script src="{{ cfg.config_url }}" defer></script>
+  <script src="{{ assets.url('game.js') }}" defer></script>
 </head>
 <body>
   <div class="wrap">
     <div class="topbar">
       <div class="score">Счет: <span id="score">{{ total_score }}</span></div>
-      <button id="spinBtn" class="btn">Крутить</button>
+      <div class="actions">
+        <button id="autoBtn" class="btn">Автоигра</button>
+        <button id="spinBtn" class="btn">Крутить</button>
+      </div>
     </div>
-
     <div class="board">
-      <div class="hint">
-        Сверху слот 5x5. В колонке берется первая сверху кирка, бонусы UP и TNT усиливают копку.
-        Снизу слои: земля(0), камень(1), руда(2), золото(3), алмаз(4), сундук(множитель 1..10).
-      </div>
-
+      <div class="hint" id="rules"></div>
       <div class="reels" id="reels"></div>
-
-      <div class="canvasWrap">
-        <canvas id="mineCanvas" width="980" height="420"></canvas>
-      </div>
-
+      <div class="canvasWrap"><canvas id="mineCanvas" width="980" height="420"></canvas></div>
       <div class="log" id="log">
         <div class="row">
           <div class="pill">Гейн за спин: <span class="gain" id="lastGain">0</span></div>
@@ -313,503 +634,374 @@ INDEX_HTML = r"""<!doctype html>
       </div>
     </div>
   </div>
+</body>
+</html>
+"""
 
-<script>
-  const REELS_ROWS = {{ reels_rows }};
-  const REELS_COLS = {{ reels_cols }};
-  const BLOCKS = {{ blocks_json | safe }};
-
-  function symText(s) {
-    if (s === "WOOD") return "⛏️ WOOD x2";
-    if (s === "STONE") return "⛏️ STONE x4";
-    if (s === "IRON") return "⛏️ IRON x8";
-    if (s === "DIAMOND") return "⛏️ DIAM x12";
-    if (s === "UP2") return "BONUS x2";
-    if (s === "TNT") return "TNT";
-    return " ";
-  }
-
-  function symClass(s) {
-    if (["WOOD","STONE","IRON","DIAMOND"].includes(s)) return "tag-pick";
-    if (s === "UP2") return "tag-up";
-    if (s === "TNT") return "tag-tnt";
-    return "tag-empty";
-  }
-
-  function renderReels(reels) {
-    const root = document.getElementById("reels");
-    root.innerHTML = "";
-    for (let c = 0; c < REELS_COLS; c++) {
-      const col = document.createElement("div");
-      col.className = "col";
-      for (let r = 0; r < REELS_ROWS; r++) {
-        const cell = document.createElement("div");
-        const s = reels[r][c];
-        cell.className = "cell small " + symClass(s);
-        cell.textContent = symText(s);
-        col.appendChild(cell);
-      }
-      root.appendChild(col);
-    }
-  }
-
-  function setStatus(t) {
-    document.getElementById("status").textContent = t;
-  }
-  function setDetails(html) {
-    document.getElementById("details").innerHTML = html;
-  }
-  function sleep(ms){ return new Promise(r => setTimeout(r, ms)); }
-
-  // ---------------------------
-  // Canvas animation
-  // ---------------------------
-
-  const PICKAXE_POWER = {
-    "WOOD": 10,
-    "STONE": 16,
-    "IRON": 24,
-    "DIAMOND": 32
-  };
-
-  const BLOCK_COLORS = {
-    "DIRT": "#5a3a2b",
-    "STONE": "#4c5463",
-    "ORE": "#5d6b7a",
-    "GOLD": "#80621d",
-    "DIAM": "#1b6a7a",
-    "CHEST": "#6a3b1b"
-  };
-
-  const BLOCK_REWARD = {
-    "DIRT": 0,
-    "STONE": 1,
-    "ORE": 2,
-    "GOLD": 3,
-    "DIAM": 4,
-    "CHEST": 0
-  };
-
-  function getColumnSyms(reels, col){
-    const out = [];
-    for(let r=0;r<REELS_ROWS;r++) out.push(reels[r][col]);
-    return out;
-  }
-
-  function computePickaxeState(colSyms){
-    let base = "WOOD";
-    for(const s of colSyms){
-      if(["WOOD","STONE","IRON","DIAMOND"].includes(s)){ base = s; break; }
-    }
-    let power = PICKAXE_POWER[base];
-    let mult2 = 0;
-    let tnt = 0;
-    for(const s of colSyms){
-      if(s === "UP2"){ mult2++; }
-      if(s === "TNT"){ tnt++; }
-    }
-    power = power * Math.pow(2, mult2) + 10 * tnt;
-    return { base, power, mult2, tnt };
-  }
-
-  function simulateMining(colSyms){
-    const pk = computePickaxeState(colSyms);
-    let pickHp = pk.power;
-
-    const blocks = BLOCKS.map(b => ({
-      id: b.id,
-      name: b.name,
-      hardness: b.hardness,
-      hp: b.hardness,
-    }));
-
-    let reward = 0;
-    let chestMult = 1;
-    let brokeChest = false;
-
-    const events = [];
-
-    for(let bi=0; bi<blocks.length; bi++){
-      const bl = blocks[bi];
-
-      while(bl.hp > 0){
-        if(pickHp <= 0){
-          events.push({ type:"STOP", blockIndex: bi });
-          return { events, reward, brokeChest, chestMult };
-        }
-        events.push({ type:"HIT", blockIndex: bi });
-        bl.hp -= 1;
-        pickHp -= 1;
-      }
-
-      events.push({ type:"BREAK", blockIndex: bi });
-      reward += (BLOCK_REWARD[bl.id] ?? 0);
-
-      if(bl.id === "CHEST"){
-        brokeChest = true;
-        chestMult = 1 + Math.floor(Math.random()*10); // 1..10
-        events.push({ type:"CHEST_MULT", blockIndex: bi, mult: chestMult });
-        break;
-      }
-    }
-
-    return { events, reward, brokeChest, chestMult };
-  }
-
-  function roundRect(ctx, x, y, w, h, r){
-    const rr = Math.min(r, w/2, h/2);
-    ctx.beginPath();
-    ctx.moveTo(x+rr, y);
-    ctx.arcTo(x+w, y, x+w, y+h, rr);
-    ctx.arcTo(x+w, y+h, x, y+h, rr);
-    ctx.arcTo(x, y+h, x, y, rr);
-    ctx.arcTo(x, y, x+w, y, rr);
-    ctx.closePath();
-  }
-
-  class MineAnimator {
-    constructor(canvas){
-      this.canvas = canvas;
-      this.ctx = canvas.getContext("2d");
-      this.w = canvas.width;
-      this.h = canvas.height;
-
-      this.cols = 5;
-      this.rows = BLOCKS.length;
-
-      this.margin = 18;
-      this.colGap = 14;
-      this.blockGap = 8;
-
-      this.colW = (this.w - this.margin*2 - this.colGap*(this.cols-1)) / this.cols;
-      this.blockH = (this.h - this.margin*2 - 80 - this.blockGap*(this.rows-1)) / this.rows;
-
-      this.pickYTop = this.margin + 18;
-      this.pickSize = Math.min(36, this.colW * 0.33);
-
-      this.state = null;
-    }
-
-    makeInitialState(reels){
-      const stacks = [];
-      for(let c=0;c<this.cols;c++){
-        const colSyms = getColumnSyms(reels, c);
-        const pk = computePickaxeState(colSyms);
-        const sim = simulateMining(colSyms);
-
-        const blocks = BLOCKS.map(b => ({
-          id: b.id,
-          name: b.name,
-          hardness: b.hardness,
-          hp: b.hardness,
-          broken: false
-        }));
-
-        stacks.push({
-          col: c,
-          colSyms,
-          sim,
-          blocks,
-          pick: {
-            base: pk.base,
-            hp: pk.power,
-            x: this.margin + c*(this.colW + this.colGap) + this.colW/2,
-            y: this.pickYTop,
-          },
-        });
-      }
-      return { reels, stacks };
-    }
 
-    getBlockTopY(blockIndex){
-      const y0 = this.margin + 72;
-      const y = y0 + blockIndex*(this.blockH + this.blockGap);
-      return y;
-    }
+# ---------------------------
+# Routes
+# ---------------------------
 
-    getHitY(blockIndex){
-      // бьем верх блока
-      return this.getBlockTopY(blockIndex) + 10;
-    }
+class IndexPage:
+    # шаблон компилируется один раз; все, кроме счета, заранее отрендерено в байты.
+    # gzip-вариант тоже готов заранее: голова сжата и выровнена Z_FULL_FLUSH, хвост
+    # сжат отдельным потоком, на запрос дописывается только счет stored-блоком и CRC.
+    SCORE_MARKER = "\x00total_score\x00"
 
-    draw(){
-      const ctx = this.ctx;
-      ctx.clearRect(0,0,this.w,this.h);
+    def __init__(self, html: str):
+        head, tail = html.split(self.SCORE_MARKER)
+        self.head = head.encode("utf-8")
+        self.tail = tail.encode("utf-8")
+        self.version = hashlib.sha1(self.head + b"\x00" + self.tail).hexdigest()[:16]
 
-      // фон
-      ctx.fillStyle = "rgba(255,255,255,0.02)";
-      ctx.fillRect(0,0,this.w,this.h);
+        c = zlib.compressobj(9, zlib.DEFLATED, -15)
+        self.gz_head = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff" + c.compress(self.head) + c.flush(zlib.Z_FULL_FLUSH)
+        c = zlib.compressobj(9, zlib.DEFLATED, -15)
+        self.gz_tail = c.compress(self.tail) + c.flush(zlib.Z_FINISH)
+        self.head_crc = zlib.crc32(self.head)
 
-      for(const st of this.state.stacks){
-        this.drawColumn(st);
-      }
-    }
+    def etag(self, score: int, gzip: bool) -> str:
+        return f"{self.version}-{score}{'-gz' if gzip else ''}"
 
-    drawColumn(st){
-      const ctx = this.ctx;
-      const c = st.col;
-      const x0 = this.margin + c*(this.colW + this.colGap);
-      const y0 = this.margin + 72;
-
-      // заголовок колонки: кирка и HP
-      ctx.fillStyle = "rgba(255,255,255,0.85)";
-      ctx.font = "900 12px system-ui, sans-serif";
-      ctx.fillText(`⛏ ${st.pick.base}`, x0, this.margin + 20);
-
-      ctx.fillStyle = "rgba(255,255,255,0.60)";
-      ctx.font = "900 12px system-ui, sans-serif";
-      ctx.fillText(`HP: ${Math.max(0, Math.floor(st.pick.hp))}`, x0, this.margin + 38);
-
-      // блоки
-      for(let i=0;i<this.rows;i++){
-        const b = st.blocks[i];
-        const y = y0 + i*(this.blockH + this.blockGap);
-
-        ctx.globalAlpha = b.broken ? 0.18 : 1.0;
-        ctx.fillStyle = BLOCK_COLORS[b.id] || "#333";
-        roundRect(ctx, x0, y, this.colW, this.blockH, 10);
-        ctx.fill();
-        ctx.globalAlpha = 1.0;
-
-        // hp bar
-        const frac = Math.max(0, b.hp) / b.hardness;
-        ctx.fillStyle = "rgba(0,0,0,0.35)";
-        roundRect(ctx, x0+8, y+this.blockH-12, this.colW-16, 6, 4);
-        ctx.fill();
-
-        ctx.fillStyle = "rgba(255,255,255,0.70)";
-        roundRect(ctx, x0+8, y+this.blockH-12, (this.colW-16)*frac, 6, 4);
-        ctx.fill();
-
-        // текст
-        ctx.fillStyle = "rgba(255,255,255,0.90)";
-        ctx.font = "900 12px system-ui, sans-serif";
-        ctx.fillText(b.name, x0+10, y+18);
-
-        ctx.fillStyle = "rgba(255,255,255,0.70)";
-        ctx.font = "900 11px system-ui, sans-serif";
-        ctx.fillText(`HP ${b.hp}/${b.hardness}`, x0+10, y+34);
-      }
-
-      // кирка (emoji)
-      const px = st.pick.x;
-      const py = st.pick.y;
-
-      ctx.fillStyle = "rgba(255,255,255,0.12)";
-      ctx.beginPath();
-      ctx.arc(px, py, this.pickSize*0.68, 0, Math.PI*2);
-      ctx.fill();
-
-      ctx.fillStyle = "white";
-      ctx.font = `900 ${Math.floor(this.pickSize)}px system-ui, sans-serif`;
-      ctx.textAlign = "center";
-      ctx.textBaseline = "middle";
-      ctx.fillText("⛏️", px, py);
-      ctx.textAlign = "start";
-      ctx.textBaseline = "alphabetic";
-
-      // подсказка мультика сундука (если уже известен)
-      if(st.sim && st.sim.brokeChest){
-        ctx.fillStyle = "rgba(255,211,122,0.9)";
-        ctx.font = "900 12px system-ui, sans-serif";
-        ctx.fillText(`Chest x${st.sim.chestMult}`, x0, this.h - 14);
-      }
-    }
+    def body(self, score: int) -> bytes:
+        return self.head + str(score).encode() + self.tail
 
-    async play(reels){
-      this.state = this.makeInitialState(reels);
-      this.draw();
-      const tasks = this.state.stacks.map(st => this.playColumn(st));
-      await Promise.all(tasks);
-      this.draw();
-    }
+    def gzip_body(self, score: int) -> bytes:
+        s = str(score).encode()
+        crc = zlib.crc32(self.tail, zlib.crc32(s, self.head_crc))
+        size = len(self.head) + len(s) + len(self.tail)
+        # stored-блок без BFINAL: 0x00, LEN, NLEN, данные
+        stored = b"\x00" + struct.pack("<HH", len(s), len(s) ^ 0xFFFF) + s
+        return self.gz_head + stored + self.gz_tail + struct.pack("<II", crc, size & 0xFFFFFFFF)
 
-    async playColumn(st){
-      const events = st.sim.events;
 
-      // старт
-      st.pick.y = this.pickYTop;
+INDEX_TEMPLATE = Environment(autoescape=True).from_string(INDEX_HTML)
 
-      for(const ev of events){
-        if(ev.type === "STOP") break;
+# CSS и JS с хэшем в имени и заранее сжатыми вариантами, см. assets.py
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+static_assets = AssetStore(STATIC_DIR)
 
-        if(ev.type === "HIT"){
-          const bi = ev.blockIndex;
-          await this.fallTo(st, bi);
-          await this.bounceHit(st, bi);
-        }
+# все маршруты игры; приложение собирает create_app()
+bp = Blueprint("game", __name__)
 
-        if(ev.type === "BREAK"){
-          const bi = ev.blockIndex;
-          st.blocks[bi].broken = true;
-        }
 
-        // CHEST_MULT можно сделать эффектом позже, сейчас просто текст внизу
-      }
-    }
+@bp.before_app_request
+def _start_timer():
+    g.t0 = time.perf_counter()
 
-    async fallTo(st, bi){
-      const targetY = this.getHitY(bi);
-      const steps = 14;
-      const startY = st.pick.y;
-      for(let k=1;k<=steps;k++){
-        const t = k/steps;
-        const e = t*t; // ease-in
-        st.pick.y = startY + (targetY - startY)*e;
-        this.draw();
-        await sleep(16);
-      }
-      st.pick.y = targetY;
-    }
 
-    async bounceHit(st, bi){
-      // урон по 1
-      st.pick.hp -= 1;
-      st.blocks[bi].hp = Math.max(0, st.blocks[bi].hp - 1);
-
-      const y0 = st.pick.y;
-
-      // вверх
-      const up = 11;
-      for(let k=1;k<=up;k++){
-        const t = k/up;
-        st.pick.y = y0 - 18*Math.sin((t*Math.PI)/2);
-        this.draw();
-        await sleep(16);
-      }
-      // вниз
-      const down = 9;
-      for(let k=1;k<=down;k++){
-        const t = k/down;
-        st.pick.y = y0 - 18*Math.cos((t*Math.PI)/2);
-        this.draw();
-        await sleep(16);
-      }
-      st.pick.y = y0;
-
-      this.draw();
-      await sleep(16);
-    }
-  }
-
-  // ---------------------------
-  // Game flow
-  // ---------------------------
-
-  let animator = null;
-
-  async function spin() {
-    const btn = document.getElementById("spinBtn");
-    if(btn.disabled) return;
-
-    btn.disabled = true;
-    setStatus("крутим...");
-    setDetails("Прокрутка...");
-    document.getElementById("lastGain").textContent = "0";
-
-    // псевдо-анимация слота
-    let tmp = null;
-    for (let i = 0; i < 10; i++) {
-      tmp = Array.from({length: REELS_ROWS}, () =>
-        Array.from({length: REELS_COLS}, () => ["WOOD","STONE","IRON","DIAMOND","UP2","TNT","EMPTY"][Math.floor(Math.random()*7)])
-      );
-      renderReels(tmp);
-      // обновляем шахту под фейк тоже
-      animator.state = animator.makeInitialState(tmp);
-      animator.draw();
-      await sleep(55);
-    }
+@bp.after_app_request
+def _observe_latency(response):
+    if request.url_rule is not None:
+        metrics.observe(request.url_rule.rule, time.perf_counter() - g.t0)
+    return response
 
-    const resp = await fetch("/spin", {
-      method: "POST",
-      headers: {"Content-Type": "application/json"},
-      body: JSON.stringify({})
-    });
-    const data = await resp.json();
-
-    renderReels(data.reels);
-
-    // проигрываем реальную анимацию добычи на canvas
-    setStatus("добыча...");
-    await animator.play(data.reels);
-
-    // обновляем счет и логи
-    document.getElementById("score").textContent = data.total_score;
-    document.getElementById("lastGain").textContent = data.gain;
-
-    let lines = [];
-    for (let i = 0; i < data.results.length; i++) {
-      const r = data.results[i];
-      const chest = r.broke_chest ? `, сундук x${r.chest_mult}` : ", сундук не достигнут";
-      lines.push(
-        `Колонка ${i+1}: кирка ${r.base_pickaxe}, глубина ${r.depth_reached}/${BLOCKS.length}, награда ${r.raw_reward}${chest} -> <b>${r.final_reward}</b>`
-      );
-    }
-    setDetails(lines.join("<br>"));
-    setStatus("готово");
-    btn.disabled = false;
-  }
 
-  function init() {
-    const empty = Array.from({length: REELS_ROWS}, () => Array.from({length: REELS_COLS}, () => "EMPTY"));
-    renderReels(empty);
+@bp.get("/static/<name>")
+def static_asset(name: str):
+    asset = static_assets.get(name)
+    if asset is None:
+        return Response(status=404)
+    headers = {"ETag": f'"{asset.etag}"', "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(asset.etag):
+        return Response(status=304, headers=headers)
+    body, encoding = asset.select(request.accept_encodings["br"] > 0, request.accept_encodings["gzip"] > 0)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, content_type=asset.content_type, headers=headers)
 
-    const canvas = document.getElementById("mineCanvas");
-    animator = new MineAnimator(canvas);
-    animator.state = animator.makeInitialState(empty);
-    animator.draw();
 
-    document.getElementById("spinBtn").addEventListener("click", spin);
-  }
+def session_id() -> str:
+    # в cookie только непрозрачный id, счет хранится в score_store
+    sid = session.get("sid")
+    if sid is None:
+        sid = session["sid"] = uuid.uuid4().hex
+    return sid
 
-  init();
-</script>
-</body>
-</html>
-"""
+
+@bp.get("/")
+def index():
+    page = current_config().index_page
+    score = score_store.get(session_id())
+    gzip = request.accept_encodings["gzip"] > 0
+    etag = page.etag(score, gzip)
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(page.gzip_body(score), mimetype="text/html", headers=headers)
+    return Response(page.body(score), mimetype="text/html", headers=headers)
+
+
+def result_dict(r: ColumnResult) -> dict:
+    return {
+        "base_pickaxe": r.base_pickaxe,
+        "final_power": r.final_power,
+        "depth_reached": r.depth_reached,
+        "broke_chest": r.broke_chest,
+        "chest_mult": r.chest_mult,
+        "raw_reward": r.raw_reward,
+        "final_reward": r.final_reward,
+        "events": r.events,
+    }
+
+
+# ?format=compact: таблица символов один раз, сетка и результаты - небольшие целые
+COMPACT_FIELDS = ("base_pickaxe", "final_power", "depth_reached", "broke_chest", "chest_mult", "raw_reward", "final_reward", "events")
+
+
+def spin_payload(cfg: GameConfig, codes: bytes, results: List[ColumnResult], gain: int, total_score: int,
+                 compact: bool = False, fair: Optional[dict] = None) -> dict:
+    if compact:
+        payload = {
+            "symbols": cfg.symbol_ids,
+            "fields": COMPACT_FIELDS,
+            "rows": cfg.rows,
+            "cols": cfg.cols,
+            "reels": list(codes),
+            "gain": gain,
+            "total_score": total_score,
+            "results": [
+                [cfg.symbol_codes[r.base_pickaxe], r.final_power, r.depth_reached, int(r.broke_chest), r.chest_mult, r.raw_reward, r.final_reward, r.events]
+                for r in results
+            ],
+        }
+    else:
+        payload = {
+            "reels": decode_reels(codes, cfg),
+            "gain": gain,
+            "total_score": total_score,
+            "results": [result_dict(r) for r in results],
+        }
+    if fair is not None:
+        payload["fair"] = fair
+    return payload
+
+
+def fair_block(cfg: GameConfig, server_seed: bytes, client_seed: str, nonce: int) -> dict:
+    # config - версия конфига игры: спин пересчитывается только на том же конфиге
+    return {"commitment": commitment(server_seed), "client_seed": client_seed, "nonce": nonce, "config": cfg.version}
+
+
+def play_spin(server_seed: bytes, client_seed: str, nonce: int,
+              cfg: Optional[GameConfig] = None) -> Tuple[bytearray, List[ColumnResult], int]:
+    # спин целиком определяется сидами, nonce и конфигом, см. fair.py
+    cfg = cfg or CONFIG
+    rng = FairRandom(server_seed, client_seed, nonce)
+    codes = generate_reel_codes(rng, cfg)
+    results, gain = resolve_spin_codes(codes, rng, cfg)
+    return codes, results, gain
+
+
+def settle_batch_chunk(cfg: GameConfig, sid: str, server_seed: bytes, client_seed: str, nonces: range,
+                       compact: bool = False) -> str:
+    # часть серии /spin/batch: каждый спин играется один раз, выигрыш части
+    # зачисляется одним приращением, затем строки NDJSON уходят клиенту
+    spins = [play_spin(server_seed, client_seed, nonce, cfg) for nonce in nonces]
+    gain = 0
+    for codes, results, gained in spins:
+        if audit_log:
+            audit_log.record(cfg.audit_layout, sid, codes, results, gained)
+        metrics.record_spin(cfg.symbol_ids, codes, results, gained)
+        gain += gained
+    total = score_store.add(sid, gain) - gain
+    leaderboard.update(sid, total + gain)
+    lines = []
+    for nonce, (codes, results, gained) in zip(nonces, spins):
+        total += gained
+        fair = fair_block(cfg, server_seed, client_seed, nonce)
+        lines.append(json.dumps(spin_payload(cfg, codes, results, gained, total, compact, fair), separators=(",", ":")) + "\n")
+    return "".join(lines)
+
+
+def batch_chunks(first_nonce: int, count: int) -> Iterator[range]:
+    for start in range(first_nonce, first_nonce + count, BATCH_CHUNK_SPINS):
+        yield range(start, min(start + BATCH_CHUNK_SPINS, first_nonce + count))
+
+
+def settle_spin(cfg: GameConfig, sid: str, compact: bool = False) -> dict:
+    # один спин сессии целиком: nonce, игра, счет, рейтинг, аудит, метрики
+    server_seed, client_seed, nonce = fair_seeds.reserve(sid)
+    codes, results, gain = play_spin(server_seed, client_seed, nonce, cfg)
+    total_score = score_store.add(sid, gain)
+    leaderboard.update(sid, total_score)
+    if audit_log:
+        audit_log.record(cfg.audit_layout, sid, codes, results, gain)
+    metrics.record_spin(cfg.symbol_ids, codes, results, gain)
+    fair = fair_block(cfg, server_seed, client_seed, nonce)
+    return spin_payload(cfg, codes, results, gain, total_score, compact, fair)
+
+
+@bp.post("/spin")
+def spin():
+    return jsonify(settle_spin(current_config(), session_id(), request.args.get("format") == "compact"))
 
 
-# ---------------------------
-# Routes
-# ---------------------------
+@bp.post("/spin/batch")
+def spin_batch():
+    count = request.args.get("count", 100, type=int)
+    if not 1 <= count <= MAX_BATCH_SPINS:
+        return jsonify(error=f"count must be in 1..{MAX_BATCH_SPINS}"), 400
+
+    # спины зачисляются частями по мере отправки, как в autoplay_stream: обрыв
+    # соединения останавливает серию, а отправленные строки уже зачислены
+    cfg = current_config()
+    sid = session_id()
+    server_seed, client_seed, first = fair_seeds.reserve(sid, count)
+    compact = request.args.get("format") == "compact"
+    stream = (settle_batch_chunk(cfg, sid, server_seed, client_seed, nonces, compact) for nonces in batch_chunks(first, count))
+    return Response(stream, mimetype="application/x-ndjson")
+
 
-@app.get("/")
-def index():
-    session.setdefault("total_score", 0)
-    return render_template_string(
-        INDEX_HTML,
-        total_score=session["total_score"],
-        reels_rows=REELS_ROWS,
-        reels_cols=REELS_COLS,
-        blocks_json=json.dumps(BLOCKS, ensure_ascii=False),
-    )
+def sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f"event: {event}\n" if event_id is None else f"event: {event}\nid: {event_id}\n"
+    return head + "data: " + json.dumps(data, separators=(",", ":")) + "\n\n"
+
+
+def autoplay_params(count: Optional[int], interval_ms: Optional[int]) -> Optional[str]:
+    # -> текст ошибки или None; общая проверка для Flask и ASGI
+    if count is None or not 1 <= count <= MAX_AUTOPLAY_SPINS:
+        return f"count must be in 1..{MAX_AUTOPLAY_SPINS}"
+    if interval_ms is None or not 0 <= interval_ms <= MAX_AUTOPLAY_INTERVAL_MS:
+        return f"interval_ms must be in 0..{MAX_AUTOPLAY_INTERVAL_MS}"
+    return None
+
+
+def autoplay_stream(cfg: GameConfig, sid: str, count: int, interval: float, compact: bool) -> Iterator[str]:
+    # каждый спин зачисляется до отправки своего события. При обрыве соединения
+    # сервер закрывает генератор (GeneratorExit на yield), и оставшиеся спины не играются
+    total_score = score_store.get(sid)
+    played = 0
+    try:
+        for i in range(count):
+            if i and interval:
+                time.sleep(interval)
+            payload = settle_spin(cfg, sid, compact)
+            total_score = payload["total_score"]
+            played += 1
+            yield sse_event("spin", payload, i)
+        yield sse_event("done", {"spins": played, "total_score": total_score})
+    finally:
+        if played < count:
+            log.info("autoplay for %s stopped after %d of %d spins", sid, played, count)
+
+
+@bp.get("/autoplay")
+def autoplay():
+    # Server-Sent Events: count спинов с паузой interval_ms в одном соединении
+    count = request.args.get("count", 100, type=int)
+    interval_ms = request.args.get("interval_ms", 1000, type=int)
+    error = autoplay_params(count, interval_ms)
+    if error:
+        return jsonify(error=error), 400
+    stream = autoplay_stream(current_config(), session_id(), count, interval_ms / 1000, request.args.get("format") == "compact")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream, mimetype="text/event-stream", headers=headers)
+
+
+# максимум строк в /leaderboard и соседей в /leaderboard/me
+MAX_LEADERBOARD_LIMIT = 100
+MAX_LEADERBOARD_AROUND = 10
+
+
+@bp.get("/leaderboard")
+def leaderboard_top():
+    limit = request.args.get("limit", 10, type=int)
+    if not 1 <= limit <= MAX_LEADERBOARD_LIMIT:
+        return jsonify(error=f"limit must be in 1..{MAX_LEADERBOARD_LIMIT}"), 400
+    return jsonify(total=len(leaderboard), top=leaderboard.top(limit))
+
+
+@bp.get("/leaderboard/me")
+def leaderboard_me():
+    around = request.args.get("around", 0, type=int)
+    if not 0 <= around <= MAX_LEADERBOARD_AROUND:
+        return jsonify(error=f"around must be in 0..{MAX_LEADERBOARD_AROUND}"), 400
+    return jsonify(leaderboard.me(session_id(), around))
+
+
+@bp.get("/metrics")
+def metrics_text():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.get("/fair")
+def fair_info():
+    return jsonify(fair_seeds.info(session_id()))
+
+
+def client_seed_error(client_seed) -> Optional[str]:
+    # -> текст ошибки или None; общая проверка для Flask и ASGI
+    if client_seed is not None and (not isinstance(client_seed, str) or not 0 < len(client_seed) <= 64):
+        return "client_seed must be a string of 1..64 chars"
+    return None
+
+
+@bp.post("/fair/rotate")
+def fair_rotate():
+    # раскрывает текущий server_seed и начинает новый; client_seed можно сменить
+    body = request.get_json(silent=True)
+    client_seed = body.get("client_seed") if isinstance(body, dict) else None
+    error = client_seed_error(client_seed)
+    if error:
+        return jsonify(error=error), 400
+    return jsonify(fair_seeds.rotate(session_id(), client_seed))
+
+
+def admin_allowed() -> bool:
+    token = os.environ.get("ADMIN_TOKEN")
+    return bool(token) and hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token)
+
+
+@bp.route("/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    if not admin_allowed():
+        return jsonify(error="forbidden"), 403
+    profiler: RouteProfiler = current_app.extensions["profiler"]
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        if not body.get("rate"):
+            profiler.disable()
+        else:
+            try:
+                profiler.enable(
+                    os.environ.get("PROFILE_DIR", "profiles"),
+                    float(body["rate"]),
+                    body.get("mode", "cprofile"),
+                    float(body.get("interval", 0.001)),
+                )
+            except (TypeError, ValueError) as e:
+                return jsonify(error=str(e)), 400
+    return jsonify(profiler.status())
+
+
+def create_app() -> Flask:
+    # /static/ обслуживает static_asset (имена с хэшем), встроенный маршрут Flask не нужен
+    flask_app = Flask(__name__, static_folder=None)
+    flask_app.secret_key = "change-me-please"
+    flask_app.register_blueprint(bp)
+
+    # профилирование index() и spin(): PROFILE_DIR включает его при старте,
+    # /admin/profile - на ходу; выключенное ничего не стоит (исходные view-функции)
+    profiler = flask_app.extensions["profiler"] = RouteProfiler(flask_app, ("game.index", "game.spin"))
+    if os.environ.get("PROFILE_DIR"):
+        profiler.enable(os.environ["PROFILE_DIR"], float(os.environ.get("PROFILE_RATE", "0.01")), os.environ.get("PROFILE_MODE", "cprofile"))
+
+    # производные структуры строятся здесь, а не первым запросом: с preload это
+    # происходит один раз в мастере, и воркеры делят их через copy-on-write
+    cfg = current_config()
+    cfg.index_page
+    if audit_log:
+        cfg.audit_layout
+    return flask_app
 
 
-@app.post("/spin")
-def spin():
-    session.setdefault("total_score", 0)
-    reels = generate_reels()
-    results, gain = resolve_spin(reels)
-    session["total_score"] += gain
-
-    return jsonify(
-        reels=reels,
-        gain=gain,
-        total_score=session["total_score"],
-        results=[
-            {
-                "base_pickaxe": r.base_pickaxe,
-                "final_power": r.final_power,
-                "depth_reached": r.depth_reached,
-                "broke_chest": r.broke_chest,
-                "chest_mult": r.chest_mult,
-                "raw_reward": r.raw_reward,
-                "final_reward": r.final_reward,
-            }
-            for r in results
-        ],
-    )
+app = create_app()
 
 
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=True)
+    # только для разработки; продакшен-запуск описан в README.md
+    app.run(host="127.0.0.1", port=5000, debug=os.environ.get("FLASK_DEBUG", "1") == "1")
@@ -0,0 +1,324 @@
+﻿"""ASGI-версия маршрутов /, /static, /spin, /autoplay, /leaderboard, /fair и /metrics для большого числа keep-alive соединений.
+
+Голый ASGI без фреймворка: та же игровая логика, тот же score_store,
+та же подписанная cookie сессии, что и у Flask-приложения, так что
+оба пути можно держать за одним балансировщиком.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 4
+    python -m asgi --port 8000 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from itsdangerous import BadSignature
+
+import app as game
+
+_serializer = game.app.session_interface.get_signing_serializer(game.app)
+_cookie_name = game.app.config["SESSION_COOKIE_NAME"]
+_max_age = int(game.app.permanent_session_lifetime.total_seconds())
+
+Headers = List[Tuple[bytes, bytes]]
+
+# игра и SQLite блокируют: они уходят в пул потоков (asyncio.to_thread),
+# чтобы цикл событий продолжал обслуживать остальные соединения.
+# Хранилища в памяти быстрее переключения потока и работают прямо в цикле
+_store_in_thread = os.environ.get("SCORE_STORE", "memory") != "memory"
+
+
+async def _store(fn, *args):
+    # вызов score_store / fair_seeds
+    if _store_in_thread:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+def _header(scope, name: bytes) -> str:
+    for k, v in scope["headers"]:
+        if k == name:
+            return v.decode("latin-1")
+    return ""
+
+
+def _session_id(scope) -> Tuple[str, Optional[str]]:
+    # -> (sid, значение Set-Cookie, если сессия новая)
+    raw = SimpleCookie(_header(scope, b"cookie")).get(_cookie_name)
+    if raw is not None:
+        try:
+            sid = _serializer.loads(raw.value, max_age=_max_age).get("sid")
+        except BadSignature:
+            sid = None
+        if sid:
+            return sid, None
+    sid = uuid.uuid4().hex
+    return sid, f"{_cookie_name}={_serializer.dumps({'sid': sid})}; HttpOnly; Path=/"
+
+
+async def _respond(send, status: int, body: bytes, headers: Dict[str, str], cookie: Optional[str]) -> None:
+    out: Headers = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    out.append((b"content-length", str(len(body)).encode()))
+    if cookie:
+        out.append((b"set-cookie", cookie.encode()))
+    await send({"type": "http.response.start", "status": status, "headers": out})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _static(scope, receive, send) -> None:
+    asset = game.static_assets.get(scope["path"][len(game.static_assets.prefix):])
+    if asset is None:
+        await _respond(send, 404, b"", {}, None)
+        return
+    headers = {"ETag": f'"{asset.etag}"', "Cache-Control": game.CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if f'"{asset.etag}"' in _header(scope, b"if-none-match"):
+        await _respond(send, 304, b"", headers, None)
+        return
+    accept = _header(scope, b"accept-encoding")
+    body, encoding = asset.select("br" in accept, "gzip" in accept)
+    headers["Content-Type"] = asset.content_type
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    await _respond(send, 200, body, headers, None)
+
+
+async def _index(scope, receive, send) -> None:
+    page = game.current_config().index_page
+    sid, cookie = _session_id(scope)
+    score = await _store(game.score_store.get, sid)
+    gzip = "gzip" in _header(scope, b"accept-encoding")
+    etag = page.etag(score, gzip)
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding, Cookie"}
+    if f'"{etag}"' in _header(scope, b"if-none-match"):
+        await _respond(send, 304, b"", headers, cookie)
+        return
+    headers["Content-Type"] = "text/html; charset=utf-8"
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        await _respond(send, 200, page.gzip_body(score), headers, cookie)
+    else:
+        await _respond(send, 200, page.body(score), headers, cookie)
+
+
+def _query(scope, name: str, default: str) -> str:
+    return parse_qs(scope["query_string"].decode()).get(name, [default])[0]
+
+
+def _int_query(scope, name: str, default: int) -> int:
+    # как request.args.get(..., type=int): нечисло - значение по умолчанию
+    try:
+        return int(_query(scope, name, str(default)))
+    except ValueError:
+        return default
+
+
+async def _spin(scope, receive, send) -> None:
+    sid, cookie = _session_id(scope)
+    payload = await asyncio.to_thread(game.settle_spin, game.current_config(), sid, _query(scope, "format", "") == "compact")
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    await _respond(send, 200, body, {"Content-Type": "application/json"}, cookie)
+
+
+async def _spin_batch(scope, receive, send) -> None:
+    count = _int_query(scope, "count", 100)
+    if not 1 <= count <= game.MAX_BATCH_SPINS:
+        body = json.dumps({"error": f"count must be in 1..{game.MAX_BATCH_SPINS}"}).encode()
+        await _respond(send, 400, body, {"Content-Type": "application/json"}, None)
+        return
+
+    cfg = game.current_config()
+    sid, cookie = _session_id(scope)
+    server_seed, client_seed, first = await asyncio.to_thread(game.fair_seeds.reserve, sid, count)
+
+    headers: Headers = [(b"content-type", b"application/x-ndjson")]
+    if cookie:
+        headers.append((b"set-cookie", cookie.encode()))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    compact = _query(scope, "format", "") == "compact"
+    # каждая часть играется в потоке и уходит клиенту до следующей;
+    # после ухода клиента оставшиеся части не играются
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        for nonces in game.batch_chunks(first, count):
+            lines = await asyncio.to_thread(game.settle_batch_chunk, cfg, sid, server_seed, client_seed, nonces, compact)
+            if disconnected.done():
+                return
+            await send({"type": "http.response.body", "body": lines.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+
+
+async def _autoplay(scope, receive, send) -> None:
+    count, interval_ms = _int_query(scope, "count", 100), _int_query(scope, "interval_ms", 1000)
+    error = game.autoplay_params(count, interval_ms)
+    if error:
+        await _respond(send, 400, json.dumps({"error": error}).encode(), {"Content-Type": "application/json"}, None)
+        return
+
+    cfg = game.current_config()
+    sid, cookie = _session_id(scope)
+    compact = _query(scope, "format", "") == "compact"
+    headers: Headers = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+    if cookie:
+        headers.append((b"set-cookie", cookie.encode()))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    # тело запроса уже вычитано, дальше receive() вернет только http.disconnect:
+    # пауза между спинами ждет его, и серия обрывается сразу после ухода клиента.
+    # send() после ухода клиента молча ничего не делает, поэтому флаг проверяется
+    # перед каждым спином; спин играется в потоке, так что и при interval_ms=0
+    # цикл событий получает управление на каждой итерации
+    disconnected = asyncio.ensure_future(receive())
+    total_score = await _store(game.score_store.get, sid)
+    try:
+        for i in range(count):
+            if i and interval_ms:
+                await asyncio.wait({disconnected}, timeout=interval_ms / 1000)
+            if disconnected.done():
+                return
+            payload = await asyncio.to_thread(game.settle_spin, cfg, sid, compact)
+            total_score = payload["total_score"]
+            event = game.sse_event("spin", payload, i).encode()
+            await send({"type": "http.response.body", "body": event, "more_body": True})
+        done = game.sse_event("done", {"spins": count, "total_score": total_score}).encode()
+        await send({"type": "http.response.body", "body": done})
+    finally:
+        disconnected.cancel()
+
+
+def _json(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+async def _leaderboard_top(scope, receive, send) -> None:
+    # рейтинг - индекс в памяти под коротким локом, его читают прямо в цикле
+    limit = _int_query(scope, "limit", 10)
+    if not 1 <= limit <= game.MAX_LEADERBOARD_LIMIT:
+        error = {"error": f"limit must be in 1..{game.MAX_LEADERBOARD_LIMIT}"}
+        await _respond(send, 400, _json(error), {"Content-Type": "application/json"}, None)
+        return
+    body = _json({"total": len(game.leaderboard), "top": game.leaderboard.top(limit)})
+    await _respond(send, 200, body, {"Content-Type": "application/json"}, None)
+
+
+async def _leaderboard_me(scope, receive, send) -> None:
+    around = _int_query(scope, "around", 0)
+    if not 0 <= around <= game.MAX_LEADERBOARD_AROUND:
+        error = {"error": f"around must be in 0..{game.MAX_LEADERBOARD_AROUND}"}
+        await _respond(send, 400, _json(error), {"Content-Type": "application/json"}, None)
+        return
+    sid, cookie = _session_id(scope)
+    await _respond(send, 200, _json(game.leaderboard.me(sid, around)), {"Content-Type": "application/json"}, cookie)
+
+
+async def _fair_info(scope, receive, send) -> None:
+    sid, cookie = _session_id(scope)
+    info = await _store(game.fair_seeds.info, sid)
+    await _respond(send, 200, _json(info), {"Content-Type": "application/json"}, cookie)
+
+
+async def _fair_rotate(scope, receive, send) -> None:
+    try:
+        body = json.loads(scope["body"]) if scope["body"] else None
+    except ValueError:
+        body = None
+    client_seed = body.get("client_seed") if isinstance(body, dict) else None
+    error = game.client_seed_error(client_seed)
+    if error:
+        await _respond(send, 400, _json({"error": error}), {"Content-Type": "application/json"}, None)
+        return
+    sid, cookie = _session_id(scope)
+    revealed = await _store(game.fair_seeds.rotate, sid, client_seed)
+    await _respond(send, 200, _json(revealed), {"Content-Type": "application/json"}, cookie)
+
+
+async def _metrics(scope, receive, send) -> None:
+    body = game.metrics.render().encode()
+    await _respond(send, 200, body, {"Content-Type": "text/plain; version=0.0.4"}, None)
+
+
+ROUTES = {
+    ("GET", "/"): _index,
+    ("POST", "/spin"): _spin,
+    ("POST", "/spin/batch"): _spin_batch,
+    ("GET", "/autoplay"): _autoplay,
+    ("GET", "/leaderboard"): _leaderboard_top,
+    ("GET", "/leaderboard/me"): _leaderboard_me,
+    ("GET", "/metrics"): _metrics,
+    ("GET", "/fair"): _fair_info,
+    ("POST", "/fair/rotate"): _fair_rotate,
+}
+
+# максимум тела запроса: маршрутам нужен только JSON /fair/rotate
+MAX_BODY_BYTES = 64 * 1024
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            game.leaderboard.close()
+            game.score_store.close()
+            game.fair_seeds.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    handler = ROUTES.get((scope["method"], path))
+    if handler is None and scope["method"] == "GET" and path.startswith(game.static_assets.prefix):
+        handler, path = _static, game.static_assets.prefix  # одна метка в метриках на все ассеты
+    if handler is None:
+        status = 405 if any(path == scope["path"] for _, path in ROUTES) else 404
+        await _respond(send, status, b"", {}, None)
+        return
+
+    # тело вычитывается целиком и кладется в scope["body"] (читает только /fair/rotate)
+    t0 = time.perf_counter()
+    body = b""
+    message = await receive()
+    while True:
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            await _respond(send, 413, b"", {}, None)
+            return
+        if not message.get("more_body"):
+            break
+        message = await receive()
+    scope["body"] = body
+    await handler(scope, receive, send)
+    game.metrics.observe(path, time.perf_counter() - t0)
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m asgi")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    uvicorn.run("asgi:application", host=args.host, port=args.port, workers=args.workers, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Статические CSS/JS с хэшем содержимого в имени.
+
+Файлы из static/ читаются при старте, имя получает хэш содержимого
+(game.css -> game.3f2a9c1e0b4d.css), gzip- и brotli-варианты сжимаются
+сразу же, один раз. Раз имя меняется вместе с содержимым, ответ можно
+кэшировать навсегда (immutable); HTML-оболочка страницы ссылается на
+актуальные имена через url().
+
+Ассеты конфига игры (config.<hash>.js) добавляются при компиляции
+GameConfig; старые версии остаются в памяти, чтобы страницы, открытые
+до подмены конфига, догрузились.
+
+brotli - необязательная зависимость (pip install brotli); без нее
+отдаются только gzip и несжатый вариант.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# мелочь сжимать незачем: заголовки и кадр сжатия съедят выигрыш
+MIN_COMPRESS_BYTES = 256
+
+
+class Asset(NamedTuple):
+    name: str                 # имя с хэшем, как в URL
+    content_type: str
+    etag: str
+    body: bytes
+    gzip_body: Optional[bytes]
+    br_body: Optional[bytes]
+
+    def select(self, accept_br: bool, accept_gzip: bool) -> Tuple[bytes, Optional[str]]:
+        # -> (тело, Content-Encoding)
+        if accept_br and self.br_body is not None:
+            return self.br_body, "br"
+        if accept_gzip and self.gzip_body is not None:
+            return self.gzip_body, "gzip"
+        return self.body, None
+
+
+def _content_type(filename: str) -> str:
+    kind = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return f"{kind}; charset=utf-8" if kind.startswith("text/") or kind.endswith("javascript") else kind
+
+
+class AssetStore:
+    def __init__(self, directory: Optional[str] = None, prefix: str = "/static/") -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._assets: Dict[str, Asset] = {}  # имя с хэшем -> ассет
+        self._urls: Dict[str, str] = {}      # логическое имя -> URL последней версии
+        if directory:
+            for filename in sorted(os.listdir(directory)):
+                path = os.path.join(directory, filename)
+                if os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        self.add(filename, f.read())
+
+    def add(self, filename: str, body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(filename)
+        name = f"{stem}.{digest}{ext}"
+        if name not in self._assets:
+            big = len(body) >= MIN_COMPRESS_BYTES
+            asset = Asset(
+                name=name,
+                content_type=_content_type(filename),
+                etag=digest,
+                body=body,
+                gzip_body=gzip.compress(body, 9, mtime=0) if big else None,
+                br_body=brotli.compress(body, quality=11) if big and brotli else None,
+            )
+            with self._lock:
+                self._assets[name] = asset
+        url = self.prefix + name
+        self._urls[filename] = url
+        return url
+
+    def url(self, filename: str) -> str:
+        return self._urls[filename]
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self._assets.get(name)
@@ -0,0 +1,315 @@
+﻿"""Журнал аудита спинов: append-only бинарные сегменты и быстрый сканер.
+
+Обработчик запроса только кладет кортеж в очередь (без форматирования и
+ввода-вывода); фоновый поток пачками упаковывает записи фиксированной
+ширины и дописывает их в текущий сегмент, при превышении
+segment_bytes или смене конфига игры начинается новый. У каждого
+процесса свои сегменты.
+
+Сегмент: b"SPINAUD1", u32 длина заголовка, JSON-заголовок (геометрия,
+таблица символов, награды блоков), затем записи:
+
+    ts_us     u64      время спина, микросекунды от эпохи
+    sid       16 байт  id сессии
+    gain      u32      выигрыш за спин
+    reels     3 бита на клетку, построчно, little-endian
+    columns   u16 на колонку: кирка(3) | глубина(5) | сундук(1) | множитель(4)
+
+Сканер отображает сегменты через mmap в структурированный массив
+NumPy и агрегирует без цикла по записям:
+
+    python -m audit scan /var/log/spins --by hour
+    python -m audit scan /var/log/spins --by pickaxe
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"SPINAUD1"
+
+
+def record_dtype(rows: int, cols: int):
+    import numpy as np
+
+    return np.dtype([
+        ("ts_us", "<u8"),
+        ("sid", "S16"),
+        ("gain", "<u4"),
+        ("reels", "u1", ((rows * cols * 3 + 7) // 8,)),
+        ("columns", "<u2", (cols,)),
+    ])
+
+
+def _sid_bytes(sid: str) -> bytes:
+    try:
+        raw = bytes.fromhex(sid)
+    except ValueError:
+        raw = b""
+    return raw if len(raw) == 16 else hashlib.md5(sid.encode()).digest()
+
+
+class AuditLayout:
+    # формат записи для одной версии конфига игры; он же заголовок сегмента
+    def __init__(self, rows: int, cols: int, symbols: Sequence[str], pickaxes: Sequence[str], blocks: List[dict]) -> None:
+        if len(symbols) > 8:
+            raise ValueError("3-bit reel packing supports at most 8 symbols")
+        if len(pickaxes) > 8:
+            raise ValueError("3-bit pickaxe field supports at most 8 pickaxes")
+        if len(blocks) > 31:
+            raise ValueError("5-bit depth field supports at most 31 blocks")
+        self.rows = rows
+        self.cols = cols
+        self.reel_bytes = (rows * cols * 3 + 7) // 8
+        self._record = struct.Struct(f"<Q16sI{self.reel_bytes}s{cols}H")
+        self._pick_index = {p: i for i, p in enumerate(pickaxes)}
+        self.header = json.dumps({
+            "rows": rows,
+            "cols": cols,
+            "symbols": list(symbols),
+            "pickaxes": list(pickaxes),
+            "block_rewards": [b["reward"] for b in blocks],
+            "record_size": self._record.size,
+        }).encode()
+
+    def pack(self, ts: int, sid: str, codes: bytes, results, gain: int) -> bytes:
+        cells = 0
+        for i, x in enumerate(codes):
+            cells |= x << (3 * i)
+        columns = [
+            self._pick_index[r.base_pickaxe] | r.depth_reached << 3 | r.broke_chest << 8 | r.chest_mult << 9
+            for r in results
+        ]
+        return self._record.pack(ts, _sid_bytes(sid), gain, cells.to_bytes(self.reel_bytes, "little"), *columns)
+
+
+class AuditLog:
+    def __init__(self, directory: str, segment_bytes: int = 64 << 20, batch_size: int = 4096) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._file = None
+        self._layout: Optional[AuditLayout] = None
+        self._seq = 0
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+
+        # один объект на процесс (store.PerProcess), поэтому поток стартует сразу
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, layout: AuditLayout, sid: str, codes: bytes, results, gain: int) -> None:
+        # горячий путь: только время и ссылки в очередь
+        self._queue.put((layout, time.time_ns() // 1000, sid, codes, results, gain))
+
+    def _open_segment(self, layout: AuditLayout):
+        self._seq += 1
+        name = f"spins-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._seq:04d}.bin"
+        f = open(os.path.join(self.directory, name), "ab")
+        f.write(MAGIC + struct.pack("<I", len(layout.header)) + layout.header)
+        return f
+
+    def _run(self) -> None:
+        # ошибка пачки (диск полон, запись не упаковалась) пишется в лог, пачка
+        # теряется, а поток продолжает разбирать очередь: иначе она росла бы без предела
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                stop = self._drain(item)
+            except Exception:
+                log.exception("audit batch dropped")
+                self._close_segment()  # недописанный сегмент не продолжаем
+        self._close_segment()
+
+    def _drain(self, item) -> bool:
+        # пачка из item и того, что уже лежит в очереди; -> True, если пришел стоп
+        layout = item[0]
+        batch = [layout.pack(*item[1:])]
+        stop = False
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            if item[0] is not layout:
+                # конфиг игры сменился: остаток пачки - в старый сегмент
+                self._write(layout, b"".join(batch))
+                layout, batch = item[0], []
+            batch.append(layout.pack(*item[1:]))
+        self._write(layout, b"".join(batch))
+        return stop
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                log.exception("audit segment close failed")
+            self._file = None
+
+    def _write(self, layout: AuditLayout, data: bytes) -> None:
+        if self._file is None or layout is not self._layout or self._file.tell() + len(data) > self.segment_bytes:
+            if self._file is not None:
+                self._file.close()
+            self._file = self._open_segment(layout)
+            self._layout = layout
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+# ---------------------------
+# Scanner
+# ---------------------------
+
+class Segment:
+    def __init__(self, path: str):
+        import numpy as np
+
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(8) != MAGIC:
+                raise ValueError(f"{path}: not an audit segment")
+            (hlen,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(hlen))
+            offset = 12 + hlen
+            size = os.fstat(f.fileno()).st_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > offset else None
+        self.dtype = record_dtype(self.header["rows"], self.header["cols"])
+        count = (size - offset) // self.dtype.itemsize  # хвост недописанной записи пропускаем
+        self.records = (
+            np.frombuffer(self._mmap, dtype=self.dtype, count=count, offset=offset)
+            if self._mmap is not None else np.empty(0, dtype=self.dtype)
+        )
+
+    def reels(self):
+        # (n, rows, cols) кодов символов
+        import numpy as np
+
+        h = self.header
+        bits = np.unpackbits(self.records["reels"], axis=1, bitorder="little")[:, :h["rows"] * h["cols"] * 3]
+        codes = bits.reshape(len(self.records), -1, 3) @ np.array([1, 2, 4], dtype=np.uint8)
+        return codes.reshape(-1, h["rows"], h["cols"])
+
+    def columns(self) -> Dict[str, object]:
+        import numpy as np
+
+        col = self.records["columns"]
+        depth = (col >> 3) & 0x1F
+        cum_reward = np.concatenate(([0], np.cumsum(self.header["block_rewards"])))
+        mult = col >> 9
+        return {
+            "pickaxe": col & 0x7,
+            "depth": depth,
+            "broke_chest": (col >> 8) & 1,
+            "chest_mult": mult,
+            "reward": cum_reward[depth] * mult,
+        }
+
+
+def segments(directory: str) -> Iterator[Segment]:
+    for path in sorted(glob.glob(os.path.join(directory, "spins-*.bin"))):
+        yield Segment(path)
+
+
+def _segments(source: Union[str, Iterable[Segment]]) -> Iterable[Segment]:
+    return segments(source) if isinstance(source, str) else source
+
+
+def rtp_by_hour(source: Union[str, Iterable[Segment]], bet: float = 1.0) -> Dict[str, Dict[str, float]]:
+    # source - каталог или уже открытые сегменты
+    import numpy as np
+
+    spins: Dict[int, int] = {}
+    paid: Dict[int, float] = {}
+    for seg in _segments(source):
+        hours = seg.records["ts_us"] // 3_600_000_000
+        keys, inverse = np.unique(hours, return_inverse=True)
+        counts = np.bincount(inverse)
+        gains = np.bincount(inverse, weights=seg.records["gain"])
+        for k, n, g in zip(keys.tolist(), counts.tolist(), gains.tolist()):
+            spins[k] = spins.get(k, 0) + n
+            paid[k] = paid.get(k, 0.0) + g
+    return {
+        time.strftime("%Y-%m-%dT%H:00Z", time.gmtime(k * 3600)): {"spins": spins[k], "paid": paid[k], "rtp": paid[k] / spins[k] / bet}
+        for k in sorted(spins)
+    }
+
+
+def rtp_by_pickaxe(source: Union[str, Iterable[Segment]]) -> Dict[str, Dict[str, float]]:
+    import numpy as np
+
+    out: Dict[str, Dict[str, float]] = {}
+    for seg in _segments(source):
+        cols = seg.columns()
+        picks = seg.header["pickaxes"]
+        n = np.bincount(cols["pickaxe"].ravel(), minlength=len(picks))
+        paid = np.bincount(cols["pickaxe"].ravel(), weights=cols["reward"].ravel(), minlength=len(picks))
+        chest = np.bincount(cols["pickaxe"].ravel(), weights=cols["broke_chest"].ravel(), minlength=len(picks))
+        for i, p in enumerate(picks):
+            acc = out.setdefault(p, {"columns": 0, "paid": 0.0, "chest_hits": 0})
+            acc["columns"] += int(n[i])
+            acc["paid"] += float(paid[i])
+            acc["chest_hits"] += int(chest[i])
+    for acc in out.values():
+        acc["mean_reward"] = acc["paid"] / acc["columns"] if acc["columns"] else 0.0
+        acc["chest_rate"] = acc["chest_hits"] / acc["columns"] if acc["columns"] else 0.0
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m audit")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    scan = sub.add_parser("scan", help="агрегировать сегменты журнала")
+    scan.add_argument("directory")
+    scan.add_argument("--by", choices=["hour", "pickaxe"], default="hour")
+    scan.add_argument("--bet", type=float, default=1.0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    total = 0
+
+    def counted() -> Iterator[Segment]:
+        # один проход: каждый сегмент открывается и отображается один раз
+        nonlocal total
+        for seg in segments(args.directory):
+            total += len(seg.records)
+            yield seg
+
+    result = rtp_by_hour(counted(), args.bet) if args.by == "hour" else rtp_by_pickaxe(counted())
+    elapsed = time.perf_counter() - t0
+    print(json.dumps(result, indent=2))
+    print(f"{total:,} записей за {elapsed:.2f} с ({total / max(elapsed, 1e-9):,.0f} записей/с)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+﻿"""Бенчмарки горячего пути спина и маршрутов Flask.
+
+Каждый кейс крутится заданное время, для каждой операции пишется
+латентность; в отчет идут ops/sec, p50 и p99. Отчет - JSON, его можно
+сохранить как baseline и потом сравнивать: при регрессии сверх порога
+процесс завершается с кодом 1.
+
+    python -m bench --save bench_baseline.json
+    python -m bench --compare bench_baseline.json --threshold 0.10
+    python -m bench --only resolve_spin,route_spin
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from itertools import cycle
+from typing import Callable, Dict, List
+
+import app
+from app import (
+    CONFIG,
+    generate_reel_codes,
+    generate_reels,
+    resolve_column,
+    resolve_spin,
+    resolve_spin_codes,
+    sample_outcome_spin,
+    weighted_pick,
+)
+
+
+def _case_weighted_pick() -> Callable[[], object]:
+    return lambda: weighted_pick(CONFIG.symbols)
+
+
+def _case_generate_reels() -> Callable[[], object]:
+    return generate_reels
+
+
+def _case_resolve_column() -> Callable[[], object]:
+    rng = random.Random(1)
+    cols = cycle([[reels[r][c] for r in range(CONFIG.rows)] for reels in (generate_reels(rng) for _ in range(256)) for c in range(CONFIG.cols)])
+    return lambda: resolve_column(next(cols))
+
+
+def _case_resolve_spin() -> Callable[[], object]:
+    rng = random.Random(1)
+    spins = cycle([generate_reels(rng) for _ in range(256)])
+    return lambda: resolve_spin(next(spins))
+
+
+def _case_generate_reel_codes() -> Callable[[], object]:
+    return generate_reel_codes
+
+
+def _case_resolve_spin_codes() -> Callable[[], object]:
+    rng = random.Random(1)
+    spins = cycle([generate_reel_codes(rng) for _ in range(256)])
+    return lambda: resolve_spin_codes(next(spins))
+
+
+def _case_outcome_spin() -> Callable[[], object]:
+    rng = random.Random(1)
+    CONFIG.outcomes  # таблица строится один раз, не в замере
+    return lambda: sample_outcome_spin(rng)
+
+
+def _case_route_index() -> Callable[[], object]:
+    client = app.app.test_client()
+    return lambda: client.get("/")
+
+
+def _case_route_spin() -> Callable[[], object]:
+    client = app.app.test_client()
+    return lambda: client.post("/spin", json={})
+
+
+CASES: Dict[str, Callable[[], Callable[[], object]]] = {
+    "weighted_pick": _case_weighted_pick,
+    "generate_reels": _case_generate_reels,
+    "resolve_column": _case_resolve_column,
+    "resolve_spin": _case_resolve_spin,
+    "generate_reel_codes": _case_generate_reel_codes,
+    "resolve_spin_codes": _case_resolve_spin_codes,
+    "outcome_spin": _case_outcome_spin,
+    "route_index": _case_route_index,
+    "route_spin": _case_route_spin,
+}
+
+
+def _percentile(sorted_ns: List[int], q: float) -> float:
+    idx = min(len(sorted_ns) - 1, int(q * len(sorted_ns)))
+    return sorted_ns[idx] / 1000
+
+
+def run_case(fn: Callable[[], object], duration: float, warmup: float) -> Dict[str, float]:
+    clock = time.perf_counter_ns
+    end = clock() + int(warmup * 1e9)
+    while clock() < end:
+        fn()
+
+    samples: List[int] = []
+    start = clock()
+    end = start + int(duration * 1e9)
+    t = start
+    while t < end:
+        fn()
+        now = clock()
+        samples.append(now - t)
+        t = now
+    elapsed = (t - start) / 1e9
+    samples.sort()
+    return {
+        "ops": len(samples),
+        "ops_per_sec": len(samples) / elapsed,
+        "p50_us": _percentile(samples, 0.50),
+        "p99_us": _percentile(samples, 0.99),
+    }
+
+
+def run(names: List[str], duration: float, warmup: float) -> Dict[str, object]:
+    results = {}
+    for name in names:
+        results[name] = run_case(CASES[name](), duration, warmup)
+        r = results[name]
+        print(f"{name:<16} {r['ops_per_sec']:>12,.0f} ops/s  p50 {r['p50_us']:>9.1f} us  p99 {r['p99_us']:>9.1f} us", file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "duration": duration,
+        "cases": results,
+    }
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], threshold: float, p99_threshold: float) -> List[str]:
+    failures = []
+    for name, cur in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        if cur["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            failures.append(f"{name}: ops/s {cur['ops_per_sec']:,.0f} < {base['ops_per_sec']:,.0f} (-{threshold:.0%})")
+        if cur["p99_us"] > base["p99_us"] * (1 + p99_threshold):
+            failures.append(f"{name}: p99 {cur['p99_us']:.1f} us > {base['p99_us']:.1f} us (+{p99_threshold:.0%})")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    parser.add_argument("--only", default="", help="кейсы через запятую: " + ",".join(CASES))
+    parser.add_argument("--duration", type=float, default=2.0, help="секунд на кейс")
+    parser.add_argument("--warmup", type=float, default=0.3)
+    parser.add_argument("--save", metavar="PATH", help="записать отчет как baseline")
+    parser.add_argument("--compare", metavar="PATH", help="сравнить с baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимое падение ops/s")
+    parser.add_argument("--p99-threshold", type=float, default=0.25, help="допустимый рост p99")
+    args = parser.parse_args()
+
+    names = [n for n in args.only.split(",") if n] or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"неизвестные кейсы: {', '.join(unknown)}")
+
+    report = run(names, args.duration, args.warmup)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = compare(report, baseline, args.threshold, args.p99_threshold)
+        for line in failures:
+            print("REGRESSION " + line, file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
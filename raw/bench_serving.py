@@ -0,0 +1,130 @@
+﻿"""Сравнение WSGI (gunicorn) и ASGI (uvicorn) путей на POST /spin.
+
+Поднимает каждый сервер отдельным процессом на loopback и гоняет его
+асинхронным keep-alive клиентом с --connections соединениями (у
+каждого своя cookie). Итог - JSON с пропускной способностью и
+p50/p99/p99.9 латентности по каждому серверу.
+
+    python -m bench_serving --workers 4 --connections 256 --duration 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+SERVERS = {
+    "wsgi": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "-b", f"127.0.0.1:{port}", "-w", str(workers), "-k", "gthread", "--threads", "8",
+    ],
+    "asgi": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "asgi:application",
+        "--port", str(port), "--workers", str(workers), "--no-access-log", "--log-level", "warning",
+    ],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_port(port: int, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def _client(port: int, path: str, until: float, latencies: List[float], errors: List[int]) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    cookie: Optional[str] = None
+    try:
+        while time.perf_counter() < until:
+            req = f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: 0\r\n"
+            if cookie:
+                req += f"Cookie: {cookie}\r\n"
+            t0 = time.perf_counter()
+            writer.write((req + "\r\n").encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode("latin-1").split("\r\n")[1:]:
+                name, _, value = line.partition(":")
+                name = name.lower()
+                if name == "content-length":
+                    length = int(value)
+                elif name == "set-cookie":
+                    cookie = value.strip().split(";", 1)[0]
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors.append(1)
+    finally:
+        writer.close()
+
+
+async def _load(port: int, path: str, connections: int, duration: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors: List[int] = []
+    start = time.perf_counter()
+    until = start + duration
+    await asyncio.gather(*(_client(port, path, until, latencies, errors) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def pct(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "errors": len(errors),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "p999_ms": pct(0.999),
+    }
+
+
+def run_server(kind: str, workers: int, connections: int, duration: float, path: str) -> Dict[str, float]:
+    port = _free_port()
+    proc = subprocess.Popen(SERVERS[kind](port, workers), stdout=subprocess.DEVNULL)
+    try:
+        _wait_port(port)
+        asyncio.run(_load(port, path, connections, 1.0))  # прогрев
+        return asyncio.run(_load(port, path, connections, duration))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench_serving")
+    parser.add_argument("--servers", default="wsgi,asgi")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--path", default="/spin")
+    args = parser.parse_args()
+
+    report = {}
+    for kind in args.servers.split(","):
+        report[kind] = run_server(kind, args.workers, args.connections, args.duration, args.path)
+        r = report[kind]
+        print(f"{kind}: {r['rps']:,.0f} req/s  p50 {r['p50_ms']:.2f} ms  p99 {r['p99_ms']:.2f} ms  errors {r['errors']}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
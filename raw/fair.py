@@ -0,0 +1,399 @@
+﻿"""Provably fair: каждый спин выводится из (server_seed, client_seed, nonce).
+
+Поток случайности - HMAC-SHA256(server_seed, "client_seed:nonce:counter"),
+поверх него FairRandom (подкласс random.Random), который отдается в
+generate_reel_codes и resolve_spin_codes как обычный rng. Игрок заранее
+видит commitment = sha256(server_seed); после /fair/rotate сервер
+раскрывает server_seed, и любой спин можно пересчитать.
+
+Состояние сидов лежит рядом со счетом: memory или та же база SQLite.
+Nonce выдаются блоками (hi/lo), чтобы воркеры не пересекались и спин
+не ждал записи на диск. Число выданных nonce (used, его отдают /fair и
+/fair/rotate) копится в памяти воркера и пишется в базу вместе со взятием
+следующего блока, фоновым сбросом раз в flush_interval и перед /fair и
+/fair/rotate в этом воркере; выдачу других воркеров оно видит с
+задержкой до flush_interval.
+
+    python -m fair verify spins.ndjson --workers 8
+    python -m fair verify spins.ndjson --config old_config.json --config game_config.json
+
+Строка входного файла: {"server_seed": hex, "client_seed": str,
+"nonce": int, "commitment": hex?, "config": str?, "gain": int?,
+"reels": [[...]] | [...]?}. commitment - из ответа спина, выданный до
+раскрытия сида: sha256(server_seed) обязан с ним совпасть. config -
+версия конфига игры из ответа спина; спин пересчитывается на конфиге
+этой версии из --config (по умолчанию только текущий GAME_CONFIG), так
+что спины, сыгранные до горячей подмены конфига, проверяются по старому
+файлу. reels - в подробном (символы по строкам) или компактном (коды)
+формате, сравниваются коды символов. Вывод - число проверенных спинов и
+расхождения.
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+RECIP_BPF = 2.0 ** -53
+# блоков HMAC за раз: спин 5x5 расходует около шести (25 random() по 7 байт + сундуки)
+PREFETCH_BLOCKS = 8
+
+
+class FairRandom(random.Random):
+    def __init__(self, server_seed: bytes, client_seed: str, nonce: int):
+        # HMAC с ключом и префиксом сообщения считается один раз, блоки - копии с дописанным счетчиком
+        self._mac = hmac.new(server_seed, f"{client_seed}:{nonce}:".encode(), hashlib.sha256)
+        self._counter = 0
+        self._buf = b""
+        self._pos = 0
+        super().__init__()
+
+    def seed(self, a=None, version=2) -> None:
+        # поток полностью задан сидами и nonce
+        pass
+
+    def _refill(self, n: int) -> None:
+        # дописать в буфер сразу несколько блоков, но не меньше n байт
+        blocks = max(PREFETCH_BLOCKS, (n + 31) // 32)
+        parts = [self._buf[self._pos:]]
+        for counter in range(self._counter, self._counter + blocks):
+            mac = self._mac.copy()
+            mac.update(str(counter).encode())
+            parts.append(mac.digest())
+        self._counter += blocks
+        self._buf = b"".join(parts)
+        self._pos = 0
+
+    def _take(self, n: int) -> bytes:
+        if len(self._buf) - self._pos < n:
+            self._refill(n)
+        out = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return out
+
+    def getrandbits(self, k: int) -> int:
+        if k <= 0:
+            return 0
+        n = (k + 7) // 8
+        return int.from_bytes(self._take(n), "little") >> (n * 8 - k)
+
+    def random(self) -> float:
+        # то же, что getrandbits(53) * RECIP_BPF, без промежуточных вызовов
+        pos = self._pos
+        if len(self._buf) - pos < 7:
+            self._refill(7)
+            pos = 0
+        self._pos = pos + 7
+        return (int.from_bytes(self._buf[pos:pos + 7], "little") >> 3) * RECIP_BPF
+
+
+def commitment(server_seed: bytes) -> str:
+    return hashlib.sha256(server_seed).hexdigest()
+
+
+def _new_seed() -> bytes:
+    return os.urandom(32)
+
+
+# ---------------------------
+# Seed state
+# ---------------------------
+
+class FairSeeds:
+    def reserve(self, sid: str, count: int = 1) -> Tuple[bytes, str, int]:
+        # -> (server_seed, client_seed, первый nonce); nonce first..first+count-1 закреплены за вызовом
+        raise NotImplementedError
+
+    def info(self, sid: str) -> Dict[str, object]:
+        raise NotImplementedError
+
+    def rotate(self, sid: str, client_seed: Optional[str] = None) -> Dict[str, object]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryFairSeeds(FairSeeds):
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state: Dict[str, List] = {}  # sid -> [server_seed, client_seed, next_nonce]
+
+    def _get(self, sid: str) -> List:
+        st = self._state.get(sid)
+        if st is None:
+            st = self._state[sid] = [_new_seed(), os.urandom(8).hex(), 0]
+        return st
+
+    def reserve(self, sid: str, count: int = 1) -> Tuple[bytes, str, int]:
+        with self._lock:
+            st = self._get(sid)
+            first = st[2]
+            st[2] += count
+            return st[0], st[1], first
+
+    def info(self, sid: str) -> Dict[str, object]:
+        with self._lock:
+            seed, client, nonce = self._get(sid)
+        return {"commitment": commitment(seed), "client_seed": client, "nonce": nonce}
+
+    def rotate(self, sid: str, client_seed: Optional[str] = None) -> Dict[str, object]:
+        with self._lock:
+            seed, client, nonce = self._get(sid)
+            self._state[sid] = [_new_seed(), client_seed or client, 0]
+        revealed = {"server_seed": seed.hex(), "commitment": commitment(seed), "client_seed": client, "nonces": nonce}
+        return {"revealed": revealed, "next": self.info(sid)}
+
+
+class SQLiteFairSeeds(FairSeeds):
+    BLOCK = 1000
+
+    def __init__(self, path: str, flush_interval: float = 0.5) -> None:
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fair_seeds ("
+            "sid TEXT PRIMARY KEY, server_seed BLOB NOT NULL, client_seed TEXT NOT NULL, "
+            "epoch INTEGER NOT NULL, next_nonce INTEGER NOT NULL)"
+        )
+        # used - сколько nonce выдано в этой эпохе; next_nonce - граница розданных блоков
+        if "used" not in {row[1] for row in self._conn.execute("PRAGMA table_info(fair_seeds)")}:
+            self._conn.execute("ALTER TABLE fair_seeds ADD COLUMN used INTEGER NOT NULL DEFAULT 0")
+        self._lock = threading.Lock()
+        # sid -> [epoch, server_seed, client_seed, lo, hi]: локальный блок nonce
+        self._blocks: Dict[str, List] = {}
+        # (sid, epoch) -> выдано nonce, еще не записанных в used
+        self._issued: Dict[Tuple[str, int], int] = {}
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fair-seeds-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _row(self, sid: str):
+        row = self._conn.execute("SELECT server_seed, client_seed, epoch, next_nonce FROM fair_seeds WHERE sid = ?", (sid,)).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO fair_seeds (sid, server_seed, client_seed, epoch, next_nonce) VALUES (?, ?, ?, 0, 0)",
+                (sid, _new_seed(), os.urandom(8).hex()),
+            )
+            row = self._conn.execute("SELECT server_seed, client_seed, epoch, next_nonce FROM fair_seeds WHERE sid = ?", (sid,)).fetchone()
+        return row
+
+    def reserve(self, sid: str, count: int = 1) -> Tuple[bytes, str, int]:
+        with self._lock:
+            # эпоха читается на каждый спин: после rotate в другом воркере раскрытый сид использовать нельзя
+            epoch = self._conn.execute("SELECT epoch FROM fair_seeds WHERE sid = ?", (sid,)).fetchone()
+            blk = self._blocks.get(sid)
+            if blk is None or epoch is None or blk[0] != epoch[0] or blk[3] + count > blk[4]:
+                size = max(self.BLOCK, count)
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    seed, client, ep, nxt = self._row(sid)
+                    # выданное из прежнего блока пишется той же транзакцией; счет старой эпохи отбрасывается
+                    issued = self._issued.pop((sid, ep), 0)
+                    self._conn.execute(
+                        "UPDATE fair_seeds SET next_nonce = ?, used = used + ? WHERE sid = ?", (nxt + size, issued, sid)
+                    )
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                blk = self._blocks[sid] = [ep, bytes(seed), client, nxt, nxt + size]
+            first = blk[3]
+            blk[3] += count
+            key = (sid, blk[0])
+            self._issued[key] = self._issued.get(key, 0) + count
+            return blk[1], blk[2], first
+
+    def _flush(self) -> None:
+        # вызывается под self._lock; строки другой эпохи (после rotate) не обновляются
+        if not self._issued:
+            return
+        batch, self._issued = self._issued, {}
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "UPDATE fair_seeds SET used = used + ? WHERE sid = ? AND epoch = ?",
+                [(n, sid, epoch) for (sid, epoch), n in batch.items()],
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            for key, n in batch.items():
+                self._issued[key] = self._issued.get(key, 0) + n
+            raise
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                log.exception("fair seeds flush failed")
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self._conn.close()
+
+    def info(self, sid: str) -> Dict[str, object]:
+        with self._lock:
+            self._flush()
+            seed, client = self._row(sid)[:2]
+            used = self._used(sid)
+        return {"commitment": commitment(bytes(seed)), "client_seed": client, "nonce": used}
+
+    def _used(self, sid: str) -> int:
+        return self._conn.execute("SELECT used FROM fair_seeds WHERE sid = ?", (sid,)).fetchone()[0]
+
+    def rotate(self, sid: str, client_seed: Optional[str] = None) -> Dict[str, object]:
+        with self._lock:
+            self._flush()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seed, client, epoch, _ = self._row(sid)
+                used = self._used(sid)
+                self._conn.execute(
+                    "UPDATE fair_seeds SET server_seed = ?, client_seed = ?, epoch = ?, next_nonce = 0, used = 0 WHERE sid = ?",
+                    (_new_seed(), client_seed or client, epoch + 1, sid),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._blocks.pop(sid, None)
+        seed = bytes(seed)
+        revealed = {"server_seed": seed.hex(), "commitment": commitment(seed), "client_seed": client, "nonces": used}
+        return {"revealed": revealed, "next": self.info(sid)}
+
+
+def open_fair_seeds(url: str) -> FairSeeds:
+    # та же настройка, что у score store: memory или sqlite:///path
+    if url.startswith("sqlite:///"):
+        return SQLiteFairSeeds(url[len("sqlite:///"):])
+    return MemoryFairSeeds()
+
+
+# ---------------------------
+# Verifier
+# ---------------------------
+
+# версия -> конфиг в процессе-проверщике; файлы читаются один раз на процесс
+_verify_configs: Dict[str, object] = {}
+
+
+def _load_verify_configs(paths: Sequence[str]) -> Dict[str, object]:
+    from app import CONFIG, load_config
+
+    if not _verify_configs:
+        _verify_configs[CONFIG.version] = CONFIG
+        for path in paths:
+            cfg = load_config(path)
+            _verify_configs[cfg.version] = cfg
+    return _verify_configs
+
+
+def _reel_codes(reels, cfg) -> Optional[List[int]]:
+    # подробный формат - строки символов, компактный - плоский список кодов
+    if reels and isinstance(reels[0], list):
+        try:
+            return [cfg.symbol_codes[sym] for row in reels for sym in row]
+        except (KeyError, TypeError):
+            return None
+    return list(reels)
+
+
+def _verify_chunk(lines: List[str], configs: Sequence[str] = ()) -> Tuple[int, List[Dict[str, object]]]:
+    from app import CONFIG, play_spin
+
+    known = _load_verify_configs(configs)
+    bad = []
+    for line in lines:
+        spin = json.loads(line)
+        cfg = known.get(spin.get("config", CONFIG.version))
+        if cfg is None:
+            # конфиг этой версии не передан в --config, пересчет на другом ничего не доказывает
+            bad.append({"nonce": spin["nonce"], "known_configs": sorted(known), "claimed_config": spin["config"]})
+            continue
+        server_seed = bytes.fromhex(spin["server_seed"])
+        if "commitment" in spin and spin["commitment"] != commitment(server_seed):
+            # раскрытый сид не тот, под который спин был сыгран
+            bad.append({"nonce": spin["nonce"], "expected_commitment": commitment(server_seed), "claimed_commitment": spin["commitment"]})
+            continue
+        codes, _, gain = play_spin(server_seed, spin["client_seed"], spin["nonce"], cfg)
+        if "gain" in spin and spin["gain"] != gain:
+            bad.append({"nonce": spin["nonce"], "expected_gain": gain, "claimed_gain": spin["gain"]})
+        elif "reels" in spin and _reel_codes(spin["reels"], cfg) != list(codes):
+            bad.append({"nonce": spin["nonce"], "expected_reels": list(codes), "claimed_reels": spin["reels"]})
+    return len(lines), bad
+
+
+def verify_file(path: str, workers: Optional[int] = None, chunk: int = 20_000,
+                configs: Sequence[str] = ()) -> Tuple[int, List[Dict[str, object]]]:
+    def chunks():
+        buf: List[str] = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    buf.append(line)
+                    if len(buf) >= chunk:
+                        yield buf
+                        buf = []
+        if buf:
+            yield buf
+
+    checked = 0
+    mismatches: List[Dict[str, object]] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for n, bad in pool.map(partial(_verify_chunk, configs=tuple(configs)), chunks()):
+            checked += n
+            mismatches += bad
+    return checked, mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m fair")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ver = sub.add_parser("verify", help="пересчитать спины из NDJSON")
+    ver.add_argument("path")
+    ver.add_argument("--workers", type=int, default=None)
+    ver.add_argument("--chunk", type=int, default=20_000)
+    ver.add_argument("--config", action="append", default=[], metavar="PATH",
+                     help="файл конфига игры для спинов его версии; можно повторять")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    checked, mismatches = verify_file(args.path, args.workers, args.chunk, args.config)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"checked": checked, "mismatches": mismatches}, indent=2))
+    print(f"{checked:,} спинов за {elapsed:.1f} с ({checked / max(elapsed, 1e-9):,.0f} спин/с)", file=sys.stderr)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Конфиг gunicorn для pre-fork режима.
+
+    gunicorn -c gunicorn_prefork.py app:app
+
+app:app, а не "app:create_app()": импорт модуля app уже вызывает фабрику,
+второй вызов собрал бы еще одно приложение.
+Приложение импортируется один раз в мастере (preload_app): конфиг игры,
+таблицы сэмплера и копки, отрендеренная страница, статика и ее сжатые
+варианты строятся до fork, воркеры получают их через copy-on-write.
+gc.freeze() перед fork убирает эти объекты из поколений сборщика, иначе
+первый же проход GC в воркере трогает их заголовки и копирует страницы
+памяти.
+Хранилища, журналы и фоновые потоки открываются в каждом воркере
+лениво, при первом обращении.
+"""
+
+import gc
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WORKERS", os.cpu_count() or 1))
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", "8"))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    gc.freeze()
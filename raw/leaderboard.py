@@ -0,0 +1,320 @@
+"""Глобальная таблица лидеров с рангом за O(log n).
+
+Индекс - индексируемый skip list по ключу (-score, sid): у каждой ссылки
+хранится ширина (сколько узлов она перепрыгивает), поэтому вставка,
+удаление, ранг игрока и выборка по позиции стоят O(log n), а топ-K -
+O(log n + K).
+
+/spin только кладет новый счет в словарь ожидающих обновлений (под
+коротким локом, повторные обновления одного игрока схлопываются);
+в индекс их переносит фоновый поток или первый читатель. Счет только
+растет (выигрыш не бывает отрицательным), поэтому из нескольких
+источников берется максимум.
+
+С SQLite-хранилищем счета пишут все воркеры, и поток раз в
+poll_interval дочитывает изменившиеся строки (score_store.changes), так
+что рейтинг общий для всех процессов. Раз в snapshot_interval индекс
+сбрасывается на диск (LEADERBOARD_SNAPSHOT), при старте читается
+обратно.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from store import ScoreStore
+
+log = logging.getLogger(__name__)
+
+Key = Tuple[int, str]  # (-score, sid)
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List[Optional[_Node]] = [None] * levels
+        self.width: List[int] = [1] * levels
+
+
+class RankIndex:
+    MAX_LEVEL = 24  # хватает на ~16 млн записей
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self._rng = random.Random(seed)
+        self._nil = _Node((math.inf, ""), 0)
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._head.next = [self._nil] * self.MAX_LEVEL
+        self._size = 0
+        self._top = 1  # уровни выше не заняты, ширины на них не поддерживаются
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _level(self) -> int:
+        # геометрическое распределение с p = 1/2: 1 + число младших нулевых бит
+        x = self._rng.getrandbits(self.MAX_LEVEL - 1) | (1 << (self.MAX_LEVEL - 1))
+        return (x & -x).bit_length()
+
+    def insert(self, key: Key) -> None:
+        d = self._level()
+        if d > self._top:
+            for lv in range(self._top, d):
+                self._head.width[lv] = self._size + 1
+            self._top = d
+        top = self._top
+        chain = [self._head] * top
+        steps = [0] * top
+        node = self._head
+        for lv in reversed(range(top)):
+            while node.next[lv].key < key:
+                steps[lv] += node.width[lv]
+                node = node.next[lv]
+            chain[lv] = node
+
+        new = _Node(key, d)
+        dist = 0
+        for lv in range(d):
+            prev = chain[lv]
+            new.next[lv] = prev.next[lv]
+            prev.next[lv] = new
+            new.width[lv] = prev.width[lv] - dist
+            prev.width[lv] = dist + 1
+            dist += steps[lv]
+        for lv in range(d, top):
+            chain[lv].width[lv] += 1
+        self._size += 1
+
+    def remove(self, key: Key) -> None:
+        top = self._top
+        chain = [self._head] * top
+        node = self._head
+        for lv in reversed(range(top)):
+            while node.next[lv].key < key:
+                node = node.next[lv]
+            chain[lv] = node
+        target = chain[0].next[0]
+        if target.key != key:
+            raise KeyError(key)
+        d = len(target.next)
+        for lv in range(d):
+            prev = chain[lv]
+            prev.width[lv] += target.width[lv] - 1
+            prev.next[lv] = target.next[lv]
+        for lv in range(d, top):
+            chain[lv].width[lv] -= 1
+        self._size -= 1
+
+    def rank(self, key: Key) -> int:
+        # 0-based позиция ключа; KeyError, если его нет
+        node = self._head
+        pos = 0
+        for lv in reversed(range(self._top)):
+            while node.next[lv].key < key:
+                pos += node.width[lv]
+                node = node.next[lv]
+        if node.next[0].key != key:
+            raise KeyError(key)
+        return pos
+
+    def build(self, keys: List[Key]) -> None:
+        # заполнить пустой индекс уже отсортированными ключами за O(n)
+        if self._size:
+            raise ValueError("build() needs an empty index")
+        last = [self._head] * self.MAX_LEVEL
+        last_pos = [0] * self.MAX_LEVEL
+        for pos, key in enumerate(keys, 1):
+            d = self._level()
+            node = _Node(key, d)
+            for lv in range(d):
+                prev = last[lv]
+                prev.next[lv] = node
+                prev.width[lv] = pos - last_pos[lv]
+                last[lv] = node
+                last_pos[lv] = pos
+            self._top = max(self._top, d)
+        n = len(keys)
+        for lv in range(self.MAX_LEVEL):
+            last[lv].next[lv] = self._nil
+            last[lv].width[lv] = n + 1 - last_pos[lv]
+        self._size = n
+
+    def slice(self, start: int, count: int) -> List[Key]:
+        # count ключей начиная с позиции start (0-based)
+        if start < 0:
+            count += start
+            start = 0
+        if count <= 0 or start >= self._size:
+            return []
+        node = self._head
+        i = start + 1
+        for lv in reversed(range(self._top)):
+            while node.width[lv] <= i and node.next[lv] is not self._nil:
+                i -= node.width[lv]
+                node = node.next[lv]
+        out = []
+        while node is not self._nil and len(out) < count:
+            out.append(node.key)
+            node = node.next[0]
+        return out
+
+
+def player_id(sid: str) -> str:
+    # наружу отдается не sid, а короткий хэш от него
+    return hashlib.sha1(sid.encode()).hexdigest()[:10]
+
+
+class Leaderboard:
+    def __init__(self, source: Optional[ScoreStore] = None, snapshot_path: Optional[str] = None,
+                 snapshot_interval: float = 30.0, poll_interval: float = 1.0) -> None:
+        self.source = source
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.poll_interval = poll_interval
+
+        self._index = RankIndex()
+        self._scores: Dict[str, int] = {}
+        self._lock = threading.Lock()          # индекс и _scores
+        self._pending_lock = threading.Lock()  # только словарь ожидающих
+        self._pending: Dict[str, int] = {}
+        self._cursor = 0                       # последний прочитанный seq из source
+        self._dirty = False
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self._load(snapshot_path)
+
+        # один объект на процесс (store.PerProcess), поэтому поток стартует сразу
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="leaderboard", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- горячий путь ---
+
+    def update(self, sid: str, score: int) -> None:
+        with self._pending_lock:
+            if score > self._pending.get(sid, -1):
+                self._pending[sid] = score
+
+    # --- чтение ---
+
+    def top(self, k: int) -> List[Dict[str, object]]:
+        with self._lock:
+            self._drain()
+            keys = self._index.slice(0, k)
+        return [{"rank": i + 1, "player": player_id(sid), "score": -neg} for i, (neg, sid) in enumerate(keys)]
+
+    def me(self, sid: str, around: int = 0) -> Dict[str, object]:
+        with self._lock:
+            self._drain()
+            total = len(self._index)
+            score = self._scores.get(sid)
+            if score is None:
+                return {"player": player_id(sid), "rank": None, "score": 0, "total": total, "around": []}
+            pos = self._index.rank((-score, sid))
+            keys = self._index.slice(pos - around, 2 * around + 1) if around else []
+            first = max(0, pos - around)
+        return {
+            "player": player_id(sid),
+            "rank": pos + 1,
+            "score": score,
+            "total": total,
+            "around": [
+                {"rank": first + i + 1, "player": player_id(s), "score": -neg, "me": s == sid}
+                for i, (neg, s) in enumerate(keys)
+            ],
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._drain()
+            return len(self._index)
+
+    # --- перенос обновлений в индекс ---
+
+    def _apply(self, sid: str, score: int) -> None:
+        # вызывается под self._lock
+        old = self._scores.get(sid)
+        if old is not None:
+            if score <= old:
+                return
+            self._index.remove((-old, sid))
+        self._scores[sid] = score
+        self._index.insert((-score, sid))
+        self._dirty = True
+
+    def _drain(self) -> None:
+        # вызывается под self._lock
+        with self._pending_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+        for sid, score in batch.items():
+            self._apply(sid, score)
+
+    def _poll(self) -> None:
+        rows, cursor = self.source.changes(self._cursor)
+        with self._lock:
+            for sid, score in rows:
+                self._apply(sid, score)
+            self._cursor = cursor
+
+    # --- фоновый поток и снимки ---
+
+    def _run(self) -> None:
+        waited = 0.0
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.source is not None:
+                    self._poll()
+                with self._lock:
+                    self._drain()
+                waited += self.poll_interval
+                if self.snapshot_path and waited >= self.snapshot_interval:
+                    waited = 0.0
+                    self.snapshot()
+            except Exception:
+                log.exception("leaderboard refresh failed")
+
+    def snapshot(self) -> bool:
+        # строка заголовка с курсором source, затем "sid<TAB>score"; запись через rename
+        with self._lock:
+            self._drain()
+            if not self._dirty:
+                return False
+            lines = [f"{sid}\t{score}\n" for sid, score in self._scores.items()]
+            cursor = self._cursor
+            self._dirty = False
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"#cursor\t{cursor}\n")
+            f.writelines(lines)
+        os.replace(tmp, self.snapshot_path)
+        return True
+
+    def _load(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            header = f.readline().rstrip("\n").split("\t")
+            if header[0] == "#cursor":
+                self._cursor = int(header[1])
+            for line in f:
+                sid, _, score = line.rstrip("\n").partition("\t")
+                self._scores[sid] = int(score)
+        self._index.build(sorted((-score, sid) for sid, score in self._scores.items()))
+        self._dirty = False
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if self.snapshot_path:
+            self.snapshot()
@@ -0,0 +1,369 @@
+"""Локальный нагрузочный тест: тысячи игроков с cookie против /, /spin и /autoplay.
+
+Каждый игрок - корутина со своим keep-alive соединением и своей cookie
+сессии. Первый визит - GET / и статика со страницы, дальше цикл: пауза
+(--think-ms, экспоненциальная), затем POST /spin или, с вероятностью
+--page-ratio, снова GET /. Доля --autoplay-ratio игроков вместо ручных
+спинов открывает серии GET /autoplay (SSE) с той же паузой между спинами.
+Игроки стартуют равномерно за --ramp секунд.
+
+Отчет - JSON: по каждому маршруту число запросов, пропускная способность,
+доля ошибок и p50/p95/p99 латентности (для /autoplay - время до первого
+события и число спинов), плюс итог по всем запросам.
+
+Цель - только локальная:
+
+    python -m loadtest --inprocess --players 2000 --duration 30
+    python -m loadtest --url http://127.0.0.1:8000 --players 500 --autoplay-ratio 0.2
+
+--inprocess поднимает gunicorn прямо из этого процесса с настройками
+gunicorn_prefork.py на Unix-сокете во временном каталоге: сеть не нужна.
+Воркеров несколько, поэтому счет и сиды лежат в SQLite в том же каталоге
+(SCORE_STORE, если он не задан явно): хранилище memory - на один процесс.
+--url принимает только loopback-адреса.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import multiprocessing
+import os
+import random
+import re
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+ASSET_RE = re.compile(rb'(?:href|src)="(/static/[^"]+)"')
+
+
+class _Route:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.events = 0  # только /autoplay: полученные спины
+
+    def summary(self, elapsed: float) -> Dict[str, float]:
+        lat = sorted(self.latencies)
+        total = len(lat) + self.errors
+        out = {
+            "requests": total,
+            "rps": total / elapsed if elapsed else 0.0,
+            "errors": self.errors,
+            "error_rate": self.errors / total if total else 0.0,
+            "p50_ms": _pct(lat, 0.50),
+            "p95_ms": _pct(lat, 0.95),
+            "p99_ms": _pct(lat, 0.99),
+        }
+        if self.events:
+            out["spins"] = self.events
+        return out
+
+
+def _pct(sorted_lat: List[float], q: float) -> float:
+    return sorted_lat[min(len(sorted_lat) - 1, int(q * len(sorted_lat)))] * 1000 if sorted_lat else 0.0
+
+
+class _Conn:
+    # минимальный HTTP/1.1-клиент поверх одного keep-alive соединения
+    def __init__(self, connect: Callable) -> None:
+        self._connect = connect
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.cookie: Optional[str] = None
+
+    async def request(self, method: str, path: str, on_chunk: Optional[Callable[[bytes], None]] = None) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await self._connect()
+        req = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: 0\r\n"
+        if self.cookie:
+            req += f"Cookie: {self.cookie}\r\n"
+        try:
+            self.writer.write((req + "\r\n").encode())
+            head = await self.reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            status = int(lines[0].split(" ", 2)[1])
+            length, chunked, close = 0, False, False
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                name, value = name.lower(), value.strip()
+                if name == "content-length":
+                    length = int(value)
+                elif name == "transfer-encoding":
+                    chunked = "chunked" in value.lower()
+                elif name == "connection":
+                    close = value.lower() == "close"
+                elif name == "set-cookie":
+                    self.cookie = value.split(";", 1)[0]
+            if chunked:
+                body = await self._read_chunked(on_chunk)
+            else:
+                body = await self.reader.readexactly(length)
+                if on_chunk and body:
+                    on_chunk(body)
+        except BaseException:
+            self.close()
+            raise
+        if close:
+            self.close()
+        return status, body
+
+    async def _read_chunked(self, on_chunk: Optional[Callable[[bytes], None]]) -> bytes:
+        parts = []
+        while True:
+            size = int((await self.reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+            if size == 0:
+                await self.reader.readuntil(b"\r\n")
+                return b"".join(parts)
+            chunk = (await self.reader.readexactly(size + 2))[:-2]
+            parts.append(chunk)
+            if on_chunk:
+                on_chunk(chunk)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class LoadTest:
+    def __init__(self, connect: Callable, players: int, duration: float, ramp: float, think: float,
+                 autoplay_ratio: float, autoplay_spins: int, page_ratio: float, seed: Optional[int] = None) -> None:
+        self.connect = connect
+        self.players = players
+        self.duration = duration
+        self.ramp = ramp
+        self.think = think
+        self.autoplay_ratio = autoplay_ratio
+        self.autoplay_spins = autoplay_spins
+        self.page_ratio = page_ratio
+        self.rng = random.Random(seed)
+        self.routes: Dict[str, _Route] = defaultdict(_Route)
+        self._until = 0.0
+
+    async def _call(self, conn: _Conn, route: str, method: str, path: str, on_chunk=None) -> Optional[bytes]:
+        stats = self.routes[route]
+        t0 = time.perf_counter()
+        try:
+            status, body = await conn.request(method, path, on_chunk)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            stats.errors += 1
+            return None
+        if status >= 400:
+            stats.errors += 1
+            return None
+        stats.latencies.append(time.perf_counter() - t0)
+        return body
+
+    async def _pause(self) -> bool:
+        # экспоненциальная пауза игрока; False, если время теста вышло
+        delay = self.rng.expovariate(1 / self.think) if self.think > 0 else 0.0
+        left = self._until - time.perf_counter()
+        if left <= 0:
+            return False
+        await asyncio.sleep(min(delay, left))
+        return time.perf_counter() < self._until
+
+    async def _visit(self, conn: _Conn, first: bool) -> None:
+        page = await self._call(conn, "GET /", "GET", "/")
+        if first and page:
+            # новый игрок тянет статику один раз, дальше она в кэше браузера
+            for asset in ASSET_RE.findall(page):
+                await self._call(conn, "GET /static", "GET", asset.decode())
+
+    async def _autoplay(self, conn: _Conn) -> None:
+        # латентность /autoplay - время до первого события, спины считаются по событиям
+        stats = self.routes["GET /autoplay"]
+        t0 = time.perf_counter()
+        first: List[float] = []
+
+        def on_chunk(chunk: bytes) -> None:
+            n = chunk.count(b"event: spin")
+            if n and not first:
+                first.append(time.perf_counter() - t0)
+            stats.events += n
+
+        interval = min(int(self.think * 1000), 60_000)  # MAX_AUTOPLAY_INTERVAL_MS
+        path = f"/autoplay?count={self.autoplay_spins}&interval_ms={interval}&format=compact"
+        try:
+            status, _ = await asyncio.wait_for(conn.request("GET", path, on_chunk), max(1.0, self._until - t0))
+        except asyncio.TimeoutError:
+            # тест закончился посреди серии: закрытие соединения останавливает ее на сервере
+            conn.close()
+            status = 200
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status = 0
+        if status != 200 or not first:
+            if status != 200:
+                stats.errors += 1
+            return
+        stats.latencies.append(first[0])
+
+    async def _player(self, start_delay: float, autoplayer: bool) -> None:
+        await asyncio.sleep(start_delay)
+        conn = _Conn(self.connect)
+        try:
+            await self._visit(conn, first=True)
+            while await self._pause():
+                if autoplayer:
+                    await self._autoplay(conn)
+                elif self.rng.random() < self.page_ratio:
+                    await self._visit(conn, first=False)
+                else:
+                    await self._call(conn, "POST /spin", "POST", "/spin?format=compact")
+        finally:
+            conn.close()
+
+    async def run(self) -> Dict[str, object]:
+        start = time.perf_counter()
+        self._until = start + self.ramp + self.duration
+        tasks = [
+            self._player(self.ramp * i / self.players, self.rng.random() < self.autoplay_ratio)
+            for i in range(self.players)
+        ]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+        total = _Route()
+        for name, r in self.routes.items():
+            if name != "GET /autoplay":
+                total.latencies += r.latencies
+                total.errors += r.errors
+        return {
+            "players": self.players,
+            "duration_s": round(elapsed, 3),
+            "think_ms": self.think * 1000,
+            "autoplay_ratio": self.autoplay_ratio,
+            "routes": {name: r.summary(elapsed) for name, r in sorted(self.routes.items())},
+            "total": total.summary(elapsed),
+        }
+
+
+# ---------------------------
+# Targets
+# ---------------------------
+
+def _serve(bind: str, workers: int, threads: int, score_store: str) -> None:
+    # дочерний процесс: gunicorn с настройками pre-fork режима
+    if os.environ.get("SCORE_STORE", "memory") == "memory":
+        os.environ["SCORE_STORE"] = score_store
+
+    from gunicorn.app.base import BaseApplication
+
+    import gunicorn_prefork
+
+    options = {
+        "bind": bind,
+        "workers": workers,
+        "threads": threads,
+        "worker_class": gunicorn_prefork.worker_class,
+        "preload_app": gunicorn_prefork.preload_app,
+        "pre_fork": gunicorn_prefork.pre_fork,
+        "worker_connections": 10_000,
+        "loglevel": "warning",
+    }
+
+    class _App(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # модуль app собирает приложение при импорте, см. gunicorn_prefork.py
+            from app import app
+
+            return app
+
+    _App().run()
+
+
+def _wait_unix(path: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.socket(socket.AF_UNIX) as s:
+                s.connect(path)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on {path} did not start")
+
+
+def _loopback_target(url: str) -> Tuple[str, int]:
+    parts = urlsplit(url)
+    if parts.scheme != "http" or not parts.hostname:
+        raise SystemExit("--url must be http://host:port")
+    host = parts.hostname
+    try:
+        addrs = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 80, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as exc:
+        raise SystemExit(f"cannot resolve {host}: {exc}")
+    if not all(ipaddress.ip_address(a.split("%", 1)[0]).is_loopback for a in addrs):
+        raise SystemExit(f"refusing non-local target {host}: loadtest runs against loopback only")
+    return host, parts.port or 80
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m loadtest")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--inprocess", action="store_true", help="поднять gunicorn из этого процесса на Unix-сокете")
+    target.add_argument("--url", help="уже запущенный сервер на loopback, например http://127.0.0.1:8000")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд после разгона")
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд стартуют все игроки")
+    parser.add_argument("--think-ms", type=float, default=1000.0, help="средняя пауза игрока между действиями")
+    parser.add_argument("--autoplay-ratio", type=float, default=0.1, help="доля игроков на /autoplay")
+    parser.add_argument("--autoplay-spins", type=int, default=50, help="спинов в одной серии /autoplay")
+    parser.add_argument("--page-ratio", type=float, default=0.05, help="доля действий ручного игрока, которые - GET /")
+    parser.add_argument("--workers", type=int, default=2, help="воркеры gunicorn для --inprocess")
+    parser.add_argument("--threads", type=int, default=8, help="потоки воркера для --inprocess")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = None
+    tmpdir = None
+    if args.inprocess:
+        tmpdir = tempfile.TemporaryDirectory(prefix="loadtest-")
+        sock = os.path.join(tmpdir.name, "app.sock")
+        store = "sqlite:///" + os.path.join(tmpdir.name, "scores.db")
+        server = multiprocessing.get_context("fork").Process(target=_serve, args=(f"unix:{sock}", args.workers, args.threads, store))
+        server.start()
+        _wait_unix(sock)
+
+        def connect():
+            return asyncio.open_unix_connection(sock, limit=1 << 20)
+    else:
+        host, port = _loopback_target(args.url)
+
+        def connect():
+            return asyncio.open_connection(host, port, limit=1 << 20)
+
+    test = LoadTest(connect, args.players, args.duration, args.ramp, args.think_ms / 1000,
+                    args.autoplay_ratio, args.autoplay_spins, args.page_ratio, args.seed)
+    try:
+        report = asyncio.run(test.run())
+    finally:
+        if server is not None:
+            os.kill(server.pid, signal.SIGTERM)
+            server.join(timeout=30)
+            tmpdir.cleanup()
+
+    t = report["total"]
+    print(
+        f"{t['requests']:,} запросов  {t['rps']:,.0f} req/s  ошибки {t['error_rate']:.2%}"
+        f"  p50 {t['p50_ms']:.1f} ms  p95 {t['p95_ms']:.1f} ms  p99 {t['p99_ms']:.1f} ms",
+        file=sys.stderr,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Метрики сервиса в текстовом формате Prometheus (/metrics).
+
+Горячий путь только увеличивает счетчики процесса под коротким локом:
+латентность - номер корзины гистограммы через bisect, спин - два
+сложения и ссылка на барабаны/результаты в список. Частоты символов,
+кирок и сундуков досчитывает фоновый поток раз в flush_interval.
+
+Несколько воркеров: при METRICS_DIR каждый процесс раз в flush_interval
+пишет свой снимок в METRICS_DIR/metrics-<pid>.json (через rename), а
+/metrics в любом воркере суммирует все файлы каталога. Файлы умерших
+воркеров остаются и продолжают входить в сумму, поэтому счетчики не
+откатываются; каталог стоит очищать перед запуском сервера.
+"""
+
+from __future__ import annotations
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+# границы корзин латентности, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _empty() -> Dict[str, object]:
+    return {
+        "latency": {},      # route -> [count по корзинам + overflow..., sum]
+        "spins": 0,
+        "gain": 0,
+        "columns": 0,
+        "chest_hits": 0,
+        "symbols": {},      # symbol -> count
+        "pickaxes": {},     # base_pickaxe -> count
+    }
+
+
+class Metrics:
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 1.0) -> None:
+        self.directory = directory
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._collect_lock = threading.Lock()  # _totals меняет только _collect
+        self._latency: Dict[str, List[float]] = {}
+        self._spins = 0
+        self._gain = 0
+        self._raw: List[Tuple[Sequence[str], bytes, list]] = []  # еще не разобранные спины
+        self._totals = _empty()  # разобранное фоновым потоком
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # один объект на процесс (store.PerProcess), поэтому поток стартует сразу
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- горячий путь ---
+
+    def observe(self, route: str, seconds: float) -> None:
+        i = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            h = self._latency.get(route)
+            if h is None:
+                h = self._latency[route] = [0] * (len(LATENCY_BUCKETS) + 2)
+            h[i] += 1
+            h[-1] += seconds
+
+    def record_spin(self, symbol_ids: Sequence[str], codes: bytes, results: list, gain: int) -> None:
+        with self._lock:
+            self._spins += 1
+            self._gain += gain
+            self._raw.append((symbol_ids, codes, results))
+
+    # --- агрегация ---
+
+    def _collect(self) -> Dict[str, object]:
+        # разбирает накопленные спины и возвращает снимок процесса
+        with self._collect_lock:
+            return self._collect_locked()
+
+    def _collect_locked(self) -> Dict[str, object]:
+        with self._lock:
+            raw, self._raw = self._raw, []
+            latency = {route: list(h) for route, h in self._latency.items()}
+            spins, gain = self._spins, self._gain
+
+        totals = self._totals
+        by_table: Dict[Tuple[str, ...], List[bytes]] = {}
+        for symbol_ids, codes, results in raw:
+            by_table.setdefault(tuple(symbol_ids), []).append(bytes(codes))
+            totals["columns"] += len(results)
+            for r in results:
+                totals["pickaxes"][r.base_pickaxe] = totals["pickaxes"].get(r.base_pickaxe, 0) + 1
+                totals["chest_hits"] += r.broke_chest
+        for symbol_ids, chunks in by_table.items():
+            for code, n in Counter(b"".join(chunks)).items():
+                sym = symbol_ids[code]
+                totals["symbols"][sym] = totals["symbols"].get(sym, 0) + n
+
+        snap = dict(totals)
+        snap["symbols"] = dict(totals["symbols"])
+        snap["pickaxes"] = dict(totals["pickaxes"])
+        snap["latency"] = latency
+        snap["spins"] = spins
+        snap["gain"] = gain
+        return snap
+
+    def _write(self, snap: Dict[str, object]) -> None:
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f)
+        os.replace(tmp, path)
+
+    def snapshot(self) -> Dict[str, object]:
+        # сумма по всем процессам (или только по текущему без METRICS_DIR)
+        own = self._collect()
+        if not self.directory:
+            return own
+        self._write(own)
+        total = _empty()
+        workers = 0
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            workers += 1
+            for key in ("spins", "gain", "columns", "chest_hits"):
+                total[key] += snap[key]
+            for key in ("symbols", "pickaxes"):
+                for name, n in snap[key].items():
+                    total[key][name] = total[key].get(name, 0) + n
+            for route, h in snap["latency"].items():
+                acc = total["latency"].setdefault(route, [0] * len(h))
+                for i, v in enumerate(h):
+                    acc[i] += v
+        total["workers"] = workers
+        return total
+
+    def render(self) -> str:
+        snap = self.snapshot()
+        out: List[str] = []
+
+        def metric(name: str, kind: str, help_: str) -> None:
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {kind}")
+
+        metric("slot_request_duration_seconds", "histogram", "Request latency by route.")
+        for route, h in sorted(snap["latency"].items()):
+            cum = 0
+            for le, n in zip(LATENCY_BUCKETS, h):
+                cum += n
+                out.append(f'slot_request_duration_seconds_bucket{{route="{route}",le="{le}"}} {cum}')
+            cum += h[len(LATENCY_BUCKETS)]
+            out.append(f'slot_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {cum}')
+            out.append(f'slot_request_duration_seconds_sum{{route="{route}"}} {h[-1]:.6f}')
+            out.append(f'slot_request_duration_seconds_count{{route="{route}"}} {cum}')
+
+        spins, gain, columns = snap["spins"], snap["gain"], snap["columns"]
+        metric("slot_spins_total", "counter", "Spins played.")
+        out.append(f"slot_spins_total {spins}")
+        metric("slot_gain_total", "counter", "Total gain paid.")
+        out.append(f"slot_gain_total {gain}")
+        metric("slot_rtp", "gauge", "Running return to player (gain per spin at bet 1).")
+        out.append(f"slot_rtp {gain / spins if spins else 0.0:.6f}")
+        metric("slot_columns_total", "counter", "Reel columns resolved.")
+        out.append(f"slot_columns_total {columns}")
+        metric("slot_chest_hits_total", "counter", "Columns that broke the chest.")
+        out.append(f"slot_chest_hits_total {snap['chest_hits']}")
+        metric("slot_chest_hit_rate", "gauge", "Share of columns that broke the chest.")
+        out.append(f"slot_chest_hit_rate {snap['chest_hits'] / columns if columns else 0.0:.6f}")
+        metric("slot_symbols_total", "counter", "Symbols drawn on the reels.")
+        for sym, n in sorted(snap["symbols"].items()):
+            out.append(f'slot_symbols_total{{symbol="{sym}"}} {n}')
+        metric("slot_base_pickaxe_total", "counter", "Columns by base pickaxe.")
+        for pick, n in sorted(snap["pickaxes"].items()):
+            out.append(f'slot_base_pickaxe_total{{pickaxe="{pick}"}} {n}')
+        if "workers" in snap:
+            metric("slot_metrics_workers", "gauge", "Worker snapshots aggregated.")
+            out.append(f"slot_metrics_workers {snap['workers']}")
+        return "\n".join(out) + "\n"
+
+    # --- фоновый поток ---
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                snap = self._collect()
+                if self.directory:
+                    self._write(snap)
+            except Exception:
+                log.exception("metrics flush failed")
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if self.directory:
+            self._write(self._collect())
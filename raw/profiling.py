@@ -0,0 +1,159 @@
+"""Профилирование маршрутов Flask по запросу.
+
+Выключенный профайлер ничего не стоит: в app.view_functions лежат
+исходные функции. При включении они подменяются обертками, которые
+профилируют долю rate запросов, а при выключении исходные функции
+возвращаются на место.
+
+Режимы:
+
+    cprofile - cProfile на запрос, файл .pstats (snakeviz, gprof2dot)
+    sample   - фоновый поток раз в interval снимает стек потока запроса,
+               файл .collapsed в формате folded stacks (flamegraph.pl,
+               speedscope)
+
+Включается переменными PROFILE_DIR / PROFILE_RATE / PROFILE_MODE при
+старте или через POST /admin/profile (заголовок X-Admin-Token должен
+совпадать с ADMIN_TOKEN). Эндпоинт меняет настройку только в том
+воркере, который принял запрос.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional, Sequence
+
+MODES = ("cprofile", "sample")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler:
+    # один поток на процесс снимает стеки всех потоков, которые сейчас профилируются
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, Counter] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self) -> None:
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def end(self) -> Counter:
+        with self._lock:
+            return self._active.pop(threading.get_ident(), Counter())
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if labels:
+                        stacks[";".join(reversed(labels))] += 1
+            time.sleep(self.interval)
+
+
+class RouteProfiler:
+    def __init__(self, app, endpoints: Sequence[str] = ("index", "spin")) -> None:
+        self.app = app
+        self.endpoints = tuple(endpoints)
+        self.directory: Optional[str] = None
+        self.rate = 0.0
+        self.mode = "cprofile"
+        self.interval = 0.001
+        self._originals: Dict[str, Callable] = {}
+        self._sampler: Optional[_StackSampler] = None
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._originals)
+
+    def enable(self, directory: str, rate: float, mode: str = "cprofile", interval: float = 0.001) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if not 0 < rate <= 1:
+            raise ValueError("rate must be in (0, 1]")
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self.directory, self.rate, self.mode, self.interval = directory, rate, mode, interval
+            self._sampler = _StackSampler(interval) if mode == "sample" else None
+            for endpoint in self.endpoints:
+                if endpoint not in self._originals:
+                    self._originals[endpoint] = self.app.view_functions[endpoint]
+                self.app.view_functions[endpoint] = self._wrap(endpoint, self._originals[endpoint])
+
+    def disable(self) -> None:
+        with self._lock:
+            for endpoint, view in self._originals.items():
+                self.app.view_functions[endpoint] = view
+            self._originals = {}
+            self.rate = 0.0
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "mode": self.mode,
+            "directory": self.directory,
+            "endpoints": list(self.endpoints),
+            "pid": os.getpid(),
+        }
+
+    def _path(self, endpoint: str, ext: str) -> str:
+        name = f"{endpoint}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(self._seq):06d}.{ext}"
+        return os.path.join(self.directory, name)
+
+    def _wrap(self, endpoint: str, view: Callable) -> Callable:
+        rate, sampler = self.rate, self._sampler
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if random.random() >= rate:
+                return view(*args, **kwargs)
+            if sampler is not None:
+                sampler.begin()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    stacks = sampler.end()
+                    if stacks:
+                        with open(self._path(endpoint, "collapsed"), "w", encoding="utf-8") as f:
+                            f.writelines(f"{stack} {n}\n" for stack, n in stacks.items())
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:
+                # в потоке уже работает другой профайлер
+                return view(*args, **kwargs)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                prof.disable()
+                prof.dump_stats(self._path(endpoint, "pstats"))
+
+        return wrapper
@@ -0,0 +1,233 @@
+﻿"""Многопроцессный Монте-Карло симулятор отдачи.
+
+Спины считаются пачками в ProcessPoolExecutor. Каждая пачка получает
+свой поток сидов из SeedSequence.spawn, а частичные агрегаты
+сливаются в порядке номеров пачек, поэтому при одном --seed
+результат (и точка ранней остановки) воспроизводится при любом
+числе воркеров. В памяти только гистограммы и счетчики.
+
+    python -m simulate --spins 50000000 --target 0.05
+    python -m simulate --engine scalar --spins 1000000 --seed 7 --json
+    python -m simulate --engine outcome --spins 200000000
+    GAME_CONFIG=game_config.large.json python -m simulate --spins 10000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, Optional
+
+import numpy as np
+
+from app import CONFIG, generate_reel_codes, resolve_spin_codes
+
+
+@dataclass
+class Stats:
+    spins: int
+    gain_sum: float
+    gain_sq_sum: float
+    gain_hist: np.ndarray     # выигрыш за спин -> число спинов
+    depth_hist: np.ndarray    # (кирка, глубина) -> число колонок
+    chest_hits: int
+
+    @classmethod
+    def empty(cls) -> "Stats":
+        return cls(0, 0.0, 0.0, np.zeros(1, dtype=np.int64), np.zeros((len(CONFIG.pickaxe_ids), len(CONFIG.blocks) + 1), dtype=np.int64), 0)
+
+    def merge(self, other: "Stats") -> None:
+        self.spins += other.spins
+        self.gain_sum += other.gain_sum
+        self.gain_sq_sum += other.gain_sq_sum
+        size = max(self.gain_hist.size, other.gain_hist.size)
+        self.gain_hist = np.pad(self.gain_hist, (0, size - self.gain_hist.size)) + np.pad(other.gain_hist, (0, size - other.gain_hist.size))
+        self.depth_hist += other.depth_hist
+        self.chest_hits += other.chest_hits
+
+    @property
+    def mean(self) -> float:
+        return self.gain_sum / self.spins if self.spins else 0.0
+
+    @property
+    def variance(self) -> float:
+        if self.spins < 2:
+            return 0.0
+        return max(0.0, (self.gain_sq_sum - self.spins * self.mean ** 2) / (self.spins - 1))
+
+    def half_width(self, confidence: float) -> float:
+        if self.spins < 2:
+            return math.inf
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return z * math.sqrt(self.variance / self.spins)
+
+    def summary(self, bet: float, confidence: float) -> Dict[str, object]:
+        columns = self.spins * CONFIG.cols
+        return {
+            "spins": self.spins,
+            "mean_gain": self.mean,
+            "rtp": self.mean / bet,
+            "rtp_ci": self.half_width(confidence) / bet,
+            "confidence": confidence,
+            "variance": self.variance,
+            "hit_frequency": 1 - self.gain_hist[0] / self.spins if self.spins else 0.0,
+            "chest_hit_rate": self.chest_hits / columns if columns else 0.0,
+            "gain_hist": {int(g): int(c) for g, c in enumerate(self.gain_hist) if c},
+            "depth_by_pickaxe": {
+                pick: {int(d): int(c) for d, c in enumerate(row) if c}
+                for pick, row in zip(CONFIG.pickaxe_ids, self.depth_hist)
+            },
+        }
+
+
+def _run_batch(seed: np.random.SeedSequence, n: int) -> Stats:
+    from batch import resolve_spin_batch
+
+    return _batch_stats(resolve_spin_batch(n, np.random.default_rng(seed)), n)
+
+
+def _run_outcome(seed: np.random.SeedSequence, n: int) -> Stats:
+    # без барабанов: одна alias-выборка исхода на колонку
+    from batch import resolve_outcome_batch
+
+    return _batch_stats(resolve_outcome_batch(n, np.random.default_rng(seed)), n)
+
+
+def _batch_stats(res, n: int) -> Stats:
+    gain = res.gain.astype(np.float64)
+    depth_hist = np.zeros((len(CONFIG.pickaxe_ids), len(CONFIG.blocks) + 1), dtype=np.int64)
+    np.add.at(depth_hist, (res.base_pickaxe.ravel(), res.depth_reached.ravel()), 1)
+    return Stats(
+        spins=n,
+        gain_sum=float(gain.sum()),
+        gain_sq_sum=float((gain * gain).sum()),
+        gain_hist=np.bincount(res.gain),
+        depth_hist=depth_hist,
+        chest_hits=int(res.broke_chest.sum()),
+    )
+
+
+def _run_scalar(seed: np.random.SeedSequence, n: int) -> Stats:
+    rng = random.Random(int.from_bytes(seed.generate_state(4, dtype=np.uint64).tobytes(), "little"))
+    stats = Stats.empty()
+    gains = []
+    pick_index = {p: i for i, p in enumerate(CONFIG.pickaxe_ids)}
+    for _ in range(n):
+        results, gain = resolve_spin_codes(generate_reel_codes(rng), rng)
+        gains.append(gain)
+        for r in results:
+            stats.depth_hist[pick_index[r.base_pickaxe], r.depth_reached] += 1
+            stats.chest_hits += r.broke_chest
+    stats.spins = n
+    stats.gain_sum = float(sum(gains))
+    stats.gain_sq_sum = float(sum(g * g for g in gains))
+    stats.gain_hist = np.bincount(gains)
+    return stats
+
+
+ENGINES = {"batch": _run_batch, "outcome": _run_outcome, "scalar": _run_scalar}
+
+
+def simulate(
+    spins: int,
+    *,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    chunk: int = 250_000,
+    engine: str = "batch",
+    target: Optional[float] = None,
+    confidence: float = 0.95,
+    bet: float = 1.0,
+    progress=None,
+) -> Stats:
+    run = ENGINES[engine]
+    sizes = [min(chunk, spins - i) for i in range(0, spins, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = workers or os.cpu_count() or 1
+
+    total = Stats.empty()
+    done: Dict[int, Stats] = {}
+    next_merge = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        submitted = 0
+        while next_merge < len(sizes):
+            while submitted < len(sizes) and len(pending) < workers * 2:
+                pending[pool.submit(run, seeds[submitted], sizes[submitted])] = submitted
+                submitted += 1
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                done[pending.pop(fut)] = fut.result()
+
+            # сливаем строго по порядку пачек, чтобы остановка не зависела от планировщика
+            while next_merge in done:
+                total.merge(done.pop(next_merge))
+                next_merge += 1
+                if progress:
+                    progress(total)
+                if target is not None and total.half_width(confidence) / bet <= target:
+                    for fut in pending:
+                        fut.cancel()
+                    return total
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m simulate")
+    parser.add_argument("--spins", type=int, default=10_000_000, help="максимум спинов")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="по умолчанию все ядра")
+    parser.add_argument("--chunk", type=int, default=250_000, help="спинов в одной пачке")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="batch")
+    parser.add_argument("--target", type=float, default=None, help="остановиться, когда полуширина CI для RTP <= target")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--bet", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="итог в JSON")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+
+    def progress(s: Stats) -> None:
+        rate = s.spins / (time.perf_counter() - t0)
+        print(
+            f"{s.spins:>12,} спинов  RTP {s.mean / args.bet:.5f} ± {s.half_width(args.confidence) / args.bet:.5f}"
+            f"  сундук {s.chest_hits / (s.spins * CONFIG.cols):.5f}  {rate:,.0f} спин/с",
+            file=sys.stderr,
+        )
+
+    stats = simulate(
+        args.spins,
+        seed=args.seed,
+        workers=args.workers,
+        chunk=args.chunk,
+        engine=args.engine,
+        target=args.target,
+        confidence=args.confidence,
+        bet=args.bet,
+        progress=progress,
+    )
+    summary = stats.summary(args.bet, args.confidence)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"спинов: {summary['spins']:,}")
+    print(f"RTP: {summary['rtp']:.5f} ± {summary['rtp_ci']:.5f} ({args.confidence:.0%})")
+    print(f"частота выигрыша: {summary['hit_frequency']:.5f}")
+    print(f"сундук в колонке: {summary['chest_hit_rate']:.5f}")
+    for pick, depths in summary["depth_by_pickaxe"].items():
+        n = sum(depths.values()) or 1
+        row = "  ".join(f"{d}:{c / n:.3f}" for d, c in depths.items())
+        print(f"  {pick:<8} {row}")
+
+
+if __name__ == "__main__":
+    main()
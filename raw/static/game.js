@@ -0,0 +1,539 @@
+// все константы игры приходят с сервера (game_config.json) отдельным
+// ассетом config.<hash>.js, который подключается перед этим файлом
+const CONFIG = window.GAME_CONFIG;
+const REELS_ROWS = CONFIG.rows;
+const REELS_COLS = CONFIG.cols;
+const BLOCKS = CONFIG.blocks;
+const SYMBOL_INFO = Object.fromEntries(CONFIG.symbols.map(s => [s.id, s]));
+const SYMBOL_IDS = CONFIG.symbols.map(s => s.id);
+
+function symText(s) {
+  const info = SYMBOL_INFO[s];
+  return info ? info.label : " ";
+}
+
+function symClass(s) {
+  const info = SYMBOL_INFO[s];
+  return "tag-" + (info ? info.kind : "empty");
+}
+
+// ячейки барабанов создаются один раз, дальше меняются только класс и текст
+let reelCells = null;
+
+function renderReels(reels) {
+  if (!reelCells) {
+    const root = document.getElementById("reels");
+    root.textContent = "";
+    reelCells = Array.from({length: REELS_ROWS}, () => []);
+    for (let c = 0; c < REELS_COLS; c++) {
+      const col = document.createElement("div");
+      col.className = "col";
+      for (let r = 0; r < REELS_ROWS; r++) {
+        const cell = document.createElement("div");
+        col.appendChild(cell);
+        reelCells[r].push({el: cell, sym: undefined});
+      }
+      root.appendChild(col);
+    }
+  }
+  for (let r = 0; r < REELS_ROWS; r++) {
+    for (let c = 0; c < REELS_COLS; c++) {
+      const cell = reelCells[r][c];
+      const s = reels[r][c];
+      if (cell.sym === s) continue;
+      cell.sym = s;
+      cell.el.className = "cell small " + symClass(s);
+      cell.el.textContent = symText(s);
+    }
+  }
+}
+
+function setStatus(t) {
+  document.getElementById("status").textContent = t;
+}
+function setDetails(html) {
+  document.getElementById("details").innerHTML = html;
+}
+function sleep(ms){ return new Promise(r => setTimeout(r, ms)); }
+
+// ---------------------------
+// Canvas animation
+// ---------------------------
+
+const BLOCK_COLORS = Object.fromEntries(BLOCKS.filter(b => b.color).map(b => [b.id, b.color]));
+
+// один удар кирки, мс: падение, отскок вверх, возврат, пауза
+const FALL_MS = 224, UP_MS = 176, DOWN_MS = 144, REST_MS = 16;
+const HIT_MS = FALL_MS + UP_MS + DOWN_MS + REST_MS;
+const BOUNCE_PX = 18;
+const CANVAS_BG = "rgba(255,255,255,0.02)";
+
+function getColumnSyms(reels, col){
+  const out = [];
+  for(let r=0;r<REELS_ROWS;r++) out.push(reels[r][col]);
+  return out;
+}
+
+function firstPickaxe(colSyms){
+  for(const s of colSyms){
+    if(SYMBOL_INFO[s] && SYMBOL_INFO[s].kind === "pick") return s;
+  }
+  return CONFIG.pickaxes[0];
+}
+
+// сила кирки до копки: пробитые блоки целиком + остаток (final_power)
+function startPower(res){
+  let power = res.final_power;
+  for(const [bi, hits, broke] of res.events){
+    if(broke) power += hits;
+  }
+  return power;
+}
+
+function roundRect(ctx, x, y, w, h, r){
+  const rr = Math.min(r, w/2, h/2);
+  ctx.beginPath();
+  ctx.moveTo(x+rr, y);
+  ctx.arcTo(x+w, y, x+w, y+h, rr);
+  ctx.arcTo(x+w, y+h, x, y+h, rr);
+  ctx.arcTo(x, y+h, x, y, rr);
+  ctx.arcTo(x, y, x+w, y, rr);
+  ctx.closePath();
+}
+
+// Один цикл requestAnimationFrame на все колонки: состояние колонки - функция
+// времени от начала анимации, за кадр перерисовываются только изменившиеся
+// колонки. Блоки, заголовки и кирка рисуются один раз во внеэкранные canvas
+// (спрайты) и дальше только копируются через drawImage.
+class MineAnimator {
+  constructor(canvas){
+    this.canvas = canvas;
+    this.ctx = canvas.getContext("2d");
+    this.cols = REELS_COLS;
+    this.rows = BLOCKS.length;
+
+    this.margin = 18;
+    this.colGap = 14;
+    this.blockGap = 8;
+
+    // высота холста растет со слоями, чтобы блоки не сжимались меньше ~40px
+    canvas.height = Math.max(canvas.height, this.margin*2 + 80 + this.rows*(40 + this.blockGap));
+    this.w = canvas.width;
+    this.h = canvas.height;
+
+    // целые размеры: спрайты копируются без сглаживания на дробных координатах
+    this.colW = Math.floor((this.w - this.margin*2 - this.colGap*(this.cols-1)) / this.cols);
+    this.blockH = Math.floor((this.h - this.margin*2 - 80 - this.blockGap*(this.rows-1)) / this.rows);
+
+    this.pickYTop = this.margin + 18;
+    this.pickSize = Math.min(36, this.colW * 0.33);
+
+    this.sprites = new Map();
+    this.state = null;
+    this.generation = 0;
+  }
+
+  // results - ответ /spin; без него (фейковая прокрутка) копки нет
+  makeInitialState(reels, results = null){
+    const stacks = [];
+    for(let c=0;c<this.cols;c++){
+      const colSyms = getColumnSyms(reels, c);
+      const res = results ? results[c] : null;
+
+      const blocks = BLOCKS.map(b => ({
+        id: b.id,
+        name: b.name,
+        hardness: b.hardness,
+        hp: b.hardness,
+        broken: false
+      }));
+
+      // события с сервера [индекс блока, ударов, сломан] -> плоский список ударов
+      const hits = [];
+      for(const [bi, n, broke] of (res ? res.events : [])){
+        for(let k=0;k<n;k++) hits.push({bi, breaks: broke && k === n-1});
+      }
+
+      stacks.push({
+        col: c,
+        colSyms,
+        hits,
+        started: 0,    // ударов, урон от которых уже нанесен
+        completed: 0,  // ударов, доигранных до конца
+        drawn: null,   // что нарисовано сейчас, чтобы не перерисовывать то же самое
+        chestMult: res && res.broke_chest ? res.chest_mult : null,
+        blocks,
+        pick: {
+          base: res ? res.base_pickaxe : firstPickaxe(colSyms),
+          hp: res ? startPower(res) : null,
+          x: this.colX(c) + this.colW/2,
+          y: this.pickYTop,
+        },
+      });
+    }
+    return { reels, stacks };
+  }
+
+  colX(c){
+    return this.margin + c*(this.colW + this.colGap);
+  }
+
+  getBlockTopY(blockIndex){
+    const y0 = this.margin + 72;
+    const y = y0 + blockIndex*(this.blockH + this.blockGap);
+    return y;
+  }
+
+  getHitY(blockIndex){
+    // бьем верх блока
+    return this.getBlockTopY(blockIndex) + 10;
+  }
+
+  show(reels){
+    // статичная картинка без копки (пустая шахта, фейковая прокрутка)
+    this.generation++;
+    this.state = this.makeInitialState(reels);
+    this.draw();
+  }
+
+  play(reels, results){
+    const generation = ++this.generation;
+    this.state = this.makeInitialState(reels, results);
+    const stacks = this.state.stacks;
+    const total = Math.max(0, ...stacks.map(st => st.hits.length)) * HIT_MS;
+    // в фоновой вкладке сразу рисуем итог: кадры там все равно не показываются
+    if(total === 0 || document.hidden){
+      for(const st of stacks) this.advance(st, Infinity);
+      this.draw();
+      return Promise.resolve();
+    }
+    this.draw();
+    return new Promise(resolve => {
+      let t0 = null;
+      const frame = now => {
+        if(generation !== this.generation) return resolve();  // начата другая анимация
+        if(t0 === null) t0 = now;
+        const t = now - t0;
+        for(const st of stacks){
+          if(this.advance(st, t)) this.drawColumn(st);
+        }
+        if(t >= total) resolve();
+        else requestAnimationFrame(frame);
+      };
+      requestAnimationFrame(frame);
+    });
+  }
+
+  // состояние колонки на момент t мс от старта; true, если картинка изменилась
+  advance(st, t){
+    const hits = st.hits;
+    const n = hits.length;
+    // урон удара j наносится в начале отскока, блок ломается после последнего удара
+    const started = Math.min(n, Math.max(0, Math.floor((t - FALL_MS) / HIT_MS) + 1));
+    for(; st.started < started; st.started++){
+      const b = st.blocks[hits[st.started].bi];
+      st.pick.hp -= 1;
+      b.hp = Math.max(0, b.hp - 1);
+    }
+    const completed = Math.min(n, Math.floor(t / HIT_MS));
+    for(; st.completed < completed; st.completed++){
+      const hit = hits[st.completed];
+      if(hit.breaks) st.blocks[hit.bi].broken = true;
+    }
+
+    let y = n ? this.getHitY(hits[n-1].bi) : this.pickYTop;
+    if(completed < n){
+      const j = completed;
+      const local = t - j*HIT_MS;
+      const targetY = this.getHitY(hits[j].bi);
+      const startY = j === 0 ? this.pickYTop : this.getHitY(hits[j-1].bi);
+      if(local < FALL_MS){
+        const e = (local / FALL_MS) ** 2;  // ease-in
+        y = startY + (targetY - startY)*e;
+      } else if(local < FALL_MS + UP_MS){
+        y = targetY - BOUNCE_PX*Math.sin(((local - FALL_MS) / UP_MS) * Math.PI/2);
+      } else if(local < FALL_MS + UP_MS + DOWN_MS){
+        y = targetY - BOUNCE_PX*Math.cos(((local - FALL_MS - UP_MS) / DOWN_MS) * Math.PI/2);
+      } else {
+        y = targetY;
+      }
+    }
+    st.pick.y = Math.round(y);
+
+    const key = `${st.pick.y}|${st.started}|${st.completed}`;
+    if(key === st.drawn) return false;
+    st.drawn = key;
+    return true;
+  }
+
+  // внеэкранный canvas, нарисованный один раз на ключ
+  sprite(key, w, h, paint){
+    let s = this.sprites.get(key);
+    if(!s){
+      s = document.createElement("canvas");
+      s.width = Math.ceil(w);
+      s.height = Math.ceil(h);
+      paint(s.getContext("2d"));
+      this.sprites.set(key, s);
+    }
+    return s;
+  }
+
+  blockSprite(i, b){
+    return this.sprite(`block:${i}:${b.hp}:${b.broken ? 1 : 0}`, this.colW, this.blockH, ctx => {
+      ctx.globalAlpha = b.broken ? 0.18 : 1.0;
+      ctx.fillStyle = BLOCK_COLORS[b.id] || "#333";
+      roundRect(ctx, 0, 0, this.colW, this.blockH, 10);
+      ctx.fill();
+      ctx.globalAlpha = 1.0;
+
+      // hp bar
+      const frac = Math.max(0, b.hp) / b.hardness;
+      ctx.fillStyle = "rgba(0,0,0,0.35)";
+      roundRect(ctx, 8, this.blockH-12, this.colW-16, 6, 4);
+      ctx.fill();
+
+      ctx.fillStyle = "rgba(255,255,255,0.70)";
+      roundRect(ctx, 8, this.blockH-12, (this.colW-16)*frac, 6, 4);
+      ctx.fill();
+
+      // текст
+      ctx.fillStyle = "rgba(255,255,255,0.90)";
+      ctx.font = "900 12px system-ui, sans-serif";
+      ctx.fillText(b.name, 10, 18);
+
+      ctx.fillStyle = "rgba(255,255,255,0.70)";
+      ctx.font = "900 11px system-ui, sans-serif";
+      ctx.fillText(`HP ${b.hp}/${b.hardness}`, 10, 34);
+    });
+  }
+
+  headerSprite(pick){
+    // заголовок колонки: кирка и HP
+    const hp = pick.hp === null ? "?" : Math.max(0, Math.floor(pick.hp));
+    return this.sprite(`head:${pick.base}:${hp}`, this.colW, 44, ctx => {
+      ctx.fillStyle = "rgba(255,255,255,0.85)";
+      ctx.font = "900 12px system-ui, sans-serif";
+      ctx.fillText(`⛏ ${pick.base}`, 0, 20);
+
+      ctx.fillStyle = "rgba(255,255,255,0.60)";
+      ctx.fillText(`HP: ${hp}`, 0, 38);
+    });
+  }
+
+  pickSprite(){
+    // кирка (emoji) в круге
+    const r = Math.ceil(Math.max(this.pickSize*0.68, this.pickSize/2)) + 2;
+    return this.sprite("pick", r*2, r*2, ctx => {
+      ctx.fillStyle = "rgba(255,255,255,0.12)";
+      ctx.beginPath();
+      ctx.arc(r, r, this.pickSize*0.68, 0, Math.PI*2);
+      ctx.fill();
+
+      ctx.fillStyle = "white";
+      ctx.font = `900 ${Math.floor(this.pickSize)}px system-ui, sans-serif`;
+      ctx.textAlign = "center";
+      ctx.textBaseline = "middle";
+      ctx.fillText("⛏️", r, r);
+    });
+  }
+
+  draw(){
+    const ctx = this.ctx;
+    ctx.clearRect(0,0,this.w,this.h);
+
+    // фон
+    ctx.fillStyle = CANVAS_BG;
+    ctx.fillRect(0,0,this.w,this.h);
+
+    for(const st of this.state.stacks){
+      this.drawColumn(st);
+    }
+  }
+
+  drawColumn(st){
+    // колонка рисуется только в своей полосе, соседние не трогаются
+    const ctx = this.ctx;
+    const x0 = this.colX(st.col);
+    const left = x0 - this.colGap/2;
+    const width = this.colW + this.colGap;
+
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(left, 0, width, this.h);
+    ctx.clip();
+    ctx.clearRect(left, 0, width, this.h);
+    ctx.fillStyle = CANVAS_BG;
+    ctx.fillRect(left, 0, width, this.h);
+
+    ctx.drawImage(this.headerSprite(st.pick), x0, this.margin);
+    for(let i=0;i<this.rows;i++){
+      ctx.drawImage(this.blockSprite(i, st.blocks[i]), x0, this.getBlockTopY(i));
+    }
+
+    const pick = this.pickSprite();
+    ctx.drawImage(pick, Math.round(st.pick.x - pick.width/2), Math.round(st.pick.y - pick.height/2));
+
+    // множитель сундука - тот, что реально начислил сервер
+    if(st.chestMult !== null && st.blocks.some(b => b.id === "CHEST" && b.broken)){
+      ctx.fillStyle = "rgba(255,211,122,0.9)";
+      ctx.font = "900 12px system-ui, sans-serif";
+      ctx.fillText(`Chest x${st.chestMult}`, x0, this.h - 14);
+    }
+    ctx.restore();
+  }
+}
+
+// ---------------------------
+// Game flow
+// ---------------------------
+
+let animator = null;
+
+async function spin() {
+  const btn = document.getElementById("spinBtn");
+  if(btn.disabled) return;
+
+  btn.disabled = true;
+  setStatus("крутим...");
+  setDetails("Прокрутка...");
+  document.getElementById("lastGain").textContent = "0";
+
+  // псевдо-анимация слота
+  let tmp = null;
+  for (let i = 0; i < 10; i++) {
+    tmp = Array.from({length: REELS_ROWS}, () =>
+      Array.from({length: REELS_COLS}, () => SYMBOL_IDS[Math.floor(Math.random()*SYMBOL_IDS.length)])
+    );
+    renderReels(tmp);
+    // обновляем шахту под фейк тоже
+    animator.show(tmp);
+    await sleep(55);
+  }
+
+  const resp = await fetch("/spin", {
+    method: "POST",
+    headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({})
+  });
+  const data = await resp.json();
+
+  await showSpin(data);
+  setStatus("готово");
+  btn.disabled = false;
+}
+
+// спин с сервера: барабаны, анимация добычи, счет и детали
+async function showSpin(data) {
+  // конфиг игры сменился на сервере: страница со старыми константами не нарисует спин
+  if (data.fair && data.fair.config !== CONFIG.version) {
+    location.reload();
+    return;
+  }
+
+  renderReels(data.reels);
+
+  // проигрываем реальную анимацию добычи на canvas
+  setStatus("добыча...");
+  await animator.play(data.reels, data.results);
+
+  // обновляем счет и логи
+  document.getElementById("score").textContent = data.total_score;
+  document.getElementById("lastGain").textContent = data.gain;
+
+  let lines = [];
+  for (let i = 0; i < data.results.length; i++) {
+    const r = data.results[i];
+    const chest = r.broke_chest ? `, сундук x${r.chest_mult}` : ", сундук не достигнут";
+    lines.push(
+      `Колонка ${i+1}: кирка ${r.base_pickaxe}, глубина ${r.depth_reached}/${BLOCKS.length}, награда ${r.raw_reward}${chest} -> <b>${r.final_reward}</b>`
+    );
+  }
+  if (data.fair) {
+    lines.push(`<span class="hint">nonce ${data.fair.nonce}, commitment ${data.fair.commitment.slice(0, 16)}…</span>`);
+  }
+  setDetails(lines.join("<br>"));
+}
+
+// ---------------------------
+// Autoplay (SSE)
+// ---------------------------
+
+const AUTOPLAY_SPINS = 50;
+const AUTOPLAY_INTERVAL_MS = 2500;
+let autoplay = null;
+
+// спины приходят одним потоком /autoplay; анимации проигрываются по очереди
+async function toggleAutoplay() {
+  const spinBtn = document.getElementById("spinBtn");
+  const autoBtn = document.getElementById("autoBtn");
+  if (autoplay) {
+    // закрытие соединения останавливает серию и на сервере
+    autoplay.source.close();
+    autoplay.queue.length = 0;
+    autoplay.done = true;
+    autoplay.wake();
+    return;
+  }
+  if (spinBtn.disabled) return;
+
+  spinBtn.disabled = true;
+  autoBtn.textContent = "Стоп";
+  setStatus("автоигра...");
+
+  const state = {
+    source: new EventSource(`/autoplay?count=${AUTOPLAY_SPINS}&interval_ms=${AUTOPLAY_INTERVAL_MS}`),
+    queue: [],
+    done: false,
+    wake: () => {},
+  };
+  autoplay = state;
+  const finish = () => {
+    state.source.close();
+    state.done = true;
+    state.wake();
+  };
+  state.source.addEventListener("spin", e => {
+    state.queue.push(JSON.parse(e.data));
+    state.wake();
+  });
+  state.source.addEventListener("done", finish);
+  // без этого EventSource переподключится сам и начнет новую серию
+  state.source.onerror = finish;
+
+  while (!state.done || state.queue.length) {
+    if (!state.queue.length) {
+      await new Promise(r => { state.wake = r; });
+      continue;
+    }
+    await showSpin(state.queue.shift());
+  }
+
+  autoplay = null;
+  autoBtn.textContent = "Автоигра";
+  setStatus("готово");
+  spinBtn.disabled = false;
+}
+
+function rulesText() {
+  const layers = BLOCKS.map(b => `${b.name.toLowerCase()}(${b.id === "CHEST" ? "множитель 1..10" : b.reward})`).join(", ");
+  return `Сверху слот ${REELS_ROWS}x${REELS_COLS}. В колонке берется первая сверху кирка, бонусы UP и TNT усиливают копку. ` +
+    `Снизу слои: ${layers}.`;
+}
+
+function init() {
+  document.getElementById("rules").textContent = rulesText();
+  document.getElementById("reels").style.setProperty("--cols", REELS_COLS);
+
+  const empty = Array.from({length: REELS_ROWS}, () => Array.from({length: REELS_COLS}, () => ""));
+  renderReels(empty);
+
+  const canvas = document.getElementById("mineCanvas");
+  animator = new MineAnimator(canvas);
+  animator.show(empty);
+
+  document.getElementById("spinBtn").addEventListener("click", spin);
+  document.getElementById("autoBtn").addEventListener("click", toggleAutoplay);
+}
+
+init();
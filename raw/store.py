@@ -0,0 +1,164 @@
+﻿"""Серверное хранилище счета.
+
+В cookie лежит только непрозрачный id сессии, сам счет живет здесь, так
+что старую cookie нельзя подсунуть, чтобы откатить счет.
+
+    memory              - dict в памяти процесса (один процесс, dev)
+    sqlite:///scores.db - SQLite в режиме WAL, безопасно для нескольких воркеров
+
+SQLite-хранилище пишет каждое приращение сразу: add() - один
+аддитивный upsert (score = score + delta) с RETURNING score в своей
+транзакции, так что параллельные воркеры не теряют обновлений друг друга,
+а каждый ответ /spin видит все приращения, закоммиченные до него, и счет
+сессии не идет назад ни в одном воркере. В режиме WAL с synchronous=NORMAL
+коммит не делает fsync (WAL синхронизируется только при checkpoint).
+Каждая записанная строка получает сквозной seq, по которому changes()
+отдает изменения всех воркеров (нужно таблице лидеров).
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class ScoreStore:
+    def get(self, sid: str) -> int:
+        raise NotImplementedError
+
+    def add(self, sid: str, delta: int) -> int:
+        raise NotImplementedError
+
+    def changes(self, since: int) -> Tuple[List[Tuple[str, int]], int]:
+        # -> (строки (sid, score), записанные другими процессами после курсора since; новый курсор)
+        return [], since
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryScoreStore(ScoreStore):
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._scores: Dict[str, int] = {}
+
+    def get(self, sid: str) -> int:
+        return self._scores.get(sid, 0)
+
+    def add(self, sid: str, delta: int) -> int:
+        with self._lock:
+            total = self._scores.get(sid, 0) + delta
+            self._scores[sid] = total
+        return total
+
+
+class SQLiteScoreStore(ScoreStore):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._writer = self._connect()
+        with self._writer:
+            self._writer.execute("CREATE TABLE IF NOT EXISTS scores (sid TEXT PRIMARY KEY, score INTEGER NOT NULL)")
+            # seq - сквозной номер последней записи строки, по нему дочитываются изменения
+            if "seq" not in {row[1] for row in self._writer.execute("PRAGMA table_info(scores)")}:
+                self._writer.execute("ALTER TABLE scores ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            self._writer.execute("CREATE INDEX IF NOT EXISTS scores_seq ON scores (seq)")
+        self._reader = self._connect()
+        self._changes_conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()       # соединение записи: транзакции по очереди
+        self._read_lock = threading.Lock()  # соединение чтения не ждет записи
+        self._closed = False
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.isolation_level = ""
+        return conn
+
+    def get(self, sid: str) -> int:
+        # чтение по первичному ключу, каждый запрос видит последний коммит
+        with self._read_lock:
+            row = self._reader.execute("SELECT score FROM scores WHERE sid = ?", (sid,)).fetchone()
+        return row[0] if row else 0
+
+    def add(self, sid: str, delta: int) -> int:
+        with self._lock, self._writer:
+            # fetchall: до коммита оператор с RETURNING должен быть дочитан
+            rows = self._writer.execute(
+                "INSERT INTO scores (sid, score, seq) VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM scores)) "
+                "ON CONFLICT(sid) DO UPDATE SET score = score + excluded.score, seq = excluded.seq RETURNING score",
+                (sid, delta),
+            ).fetchall()
+        return rows[0][0]
+
+    def changes(self, since: int, limit: int = 50_000) -> Tuple[List[Tuple[str, int]], int]:
+        # отдельное соединение: чтение идет из фонового потока и не держит self._lock
+        if self._changes_conn is None:
+            self._changes_conn = self._connect()
+        rows = self._changes_conn.execute(
+            "SELECT sid, score, seq FROM scores WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit)
+        ).fetchall()
+        if not rows:
+            return [], since
+        return [(sid, score) for sid, score, _ in rows], rows[-1][2]
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock, self._read_lock:
+            self._reader.close()
+            self._writer.close()
+        if self._changes_conn is not None:
+            self._changes_conn.close()
+
+
+class PerProcess:
+    # ленивый хэндл: объект создается при первом обращении в каждом процессе
+    # (методы хэндла не должны совпадать с методами объекта, кроме close и len),
+    # поэтому мастер с preload ничего не открывает, а воркер не наследует
+    # чужие соединения и мертвые потоки. Так обернуто все, у чего есть
+    # соединения или фоновый поток: сам объект может запускать поток прямо
+    # в __init__ и не следить за fork
+    def __init__(self, factory: Callable[[], object]) -> None:
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._obj = None
+
+    def _instance(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._obj = self._factory()
+                    self._pid = os.getpid()
+        return self._obj
+
+    def __getattr__(self, name: str):
+        return getattr(self._instance(), name)
+
+    def __len__(self) -> int:
+        return len(self._instance())
+
+    def __bool__(self) -> bool:
+        # иначе bool() пошел бы в __len__
+        return True
+
+    def close(self) -> None:
+        if self._pid == os.getpid():
+            self._obj.close()
+
+
+def open_store(url: str) -> ScoreStore:
+    if url == "memory":
+        return MemoryScoreStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteScoreStore(url[len("sqlite:///"):])
+    raise ValueError(f"unknown score store: {url!r}")
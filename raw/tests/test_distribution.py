@@ -0,0 +1,64 @@
+"""Скалярный путь, batch.py и analytic.py описывают одно распределение спина."""
+
+import random
+from fractions import Fraction
+
+import pytest
+
+import analytic
+from app import CONFIG, generate_reel_codes, resolve_spin_codes, sample_outcome_spin
+
+np = pytest.importorskip("numpy")
+batch = pytest.importorskip("batch")
+
+EXACT = analytic.spin_distribution()
+
+
+def _close(mean: float, n: int, sigmas: float = 5.0) -> bool:
+    # выборочное среднее n спинов в пределах sigmas стандартных ошибок от точного
+    return abs(mean - EXACT.mean) <= sigmas * (EXACT.variance / n) ** 0.5
+
+
+def test_exact_and_float_agree():
+    exact = analytic.spin_distribution(Fraction)
+    assert sum(exact.reward.values()) == 1
+    assert float(exact.column.chest_prob) == pytest.approx(EXACT.column.chest_prob)
+    assert exact.mean == pytest.approx(EXACT.mean, rel=1e-12)
+
+
+def test_outcome_table_matches_analytic():
+    table = CONFIG.outcomes
+    n = len(table.results)
+    # вероятность исхода i: своя доля ячейки плюс доли ячеек, отданные ему через alias
+    prob = [0.0] * n
+    for i in range(n):
+        prob[i] += table.prob[i] / n
+        prob[table.alias[i]] += (1 - table.prob[i]) / n
+    column_mean = sum(p * r.final_reward for p, r in zip(prob, table.results))
+    assert column_mean * CONFIG.cols == pytest.approx(EXACT.mean, rel=1e-9)
+
+
+def test_scalar_mean():
+    rng = random.Random(1)
+    n = 20_000
+    total = sum(resolve_spin_codes(generate_reel_codes(rng, CONFIG), rng, CONFIG)[1] for _ in range(n))
+    assert _close(total / n, n)
+
+
+def test_scalar_outcome_mean():
+    rng = random.Random(2)
+    n = 20_000
+    total = sum(sample_outcome_spin(rng, CONFIG)[2] for _ in range(n))
+    assert _close(total / n, n)
+
+
+def test_batch_mean():
+    n = 200_000
+    spins = batch.resolve_spin_batch(n, np.random.default_rng(3), CONFIG)
+    assert _close(float(spins.gain.mean()), n)
+
+
+def test_outcome_batch_mean():
+    n = 200_000
+    spins = batch.resolve_outcome_batch(n, np.random.default_rng(4), CONFIG)
+    assert _close(float(spins.gain.mean()), n)
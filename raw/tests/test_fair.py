@@ -0,0 +1,66 @@
+"""Поток FairRandom и исход спина для известных сидов не должны меняться."""
+
+import hashlib
+import hmac
+import json
+
+import app
+import fair
+from fair import RECIP_BPF, FairRandom, commitment
+
+SERVER_SEED = bytes(range(32))
+CLIENT_SEED = "player-seed"
+
+
+def _stream(nonce: int, n: int) -> bytes:
+    # поток по описанию в fair.py: HMAC-SHA256(server_seed, "client_seed:nonce:counter")
+    out = b""
+    counter = 0
+    while len(out) < n:
+        out += hmac.new(SERVER_SEED, f"{CLIENT_SEED}:{nonce}:{counter}".encode(), hashlib.sha256).digest()
+        counter += 1
+    return out[:n]
+
+
+def test_stream_bytes():
+    assert _stream(42, 40).hex() == (
+        "51076a84f500f43ce2541c0fe92290cf98d303312e6440c84ee0db5cdd6d0a75"
+        "85c131e9b5b57f9c")
+    # много блоков подряд, больше одного prefetch
+    n = 32 * (fair.PREFETCH_BLOCKS * 3 + 1) + 5
+    assert FairRandom(SERVER_SEED, CLIENT_SEED, 42)._take(n) == _stream(42, n)
+
+
+def test_random_and_getrandbits():
+    data = _stream(7, 7 * 100 + 4)
+    rng = FairRandom(SERVER_SEED, CLIENT_SEED, 7)
+    for i in range(100):
+        expected = (int.from_bytes(data[7 * i:7 * i + 7], "little") >> 3) * RECIP_BPF
+        assert rng.random() == expected
+    assert rng.getrandbits(29) == int.from_bytes(data[700:704], "little") >> 3
+
+    rng = FairRandom(SERVER_SEED, CLIENT_SEED, 42)
+    assert rng.random() == 0.9531396339680474
+    assert rng.getrandbits(13) == 7239
+    assert rng.randint(1, 10) == 6
+
+
+def test_known_spin():
+    # золотые значения для game_config.json из репозитория
+    codes, results, gain = app.play_spin(SERVER_SEED, CLIENT_SEED, 43, app.CONFIG)
+    assert codes.hex() == "05030005010104020406040103020100060206020303030100"
+    assert [r.chest_mult for r in results] == [2, 7, 1, 1, 1]
+    assert gain == 104
+    assert commitment(SERVER_SEED) == "630dcd2966c4336691125448bbb25b4ff412a49c732db2c8abc1b8581bd710dd"
+
+
+def test_verify_known_spin():
+    codes, _, gain = app.play_spin(SERVER_SEED, CLIENT_SEED, 43, app.CONFIG)
+    line = json.dumps({"server_seed": SERVER_SEED.hex(), "client_seed": CLIENT_SEED, "nonce": 43,
+                       "commitment": commitment(SERVER_SEED), "config": app.CONFIG.version,
+                       "gain": gain, "reels": list(codes)})
+    assert fair._verify_chunk([line]) == (1, [])
+    bad = json.loads(line)
+    bad["gain"] += 1
+    checked, mismatches = fair._verify_chunk([json.dumps(bad)])
+    assert checked == 1 and len(mismatches) == 1
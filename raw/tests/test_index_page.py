@@ -0,0 +1,42 @@
+"""Склеенный gzip-ответ IndexPage распаковывается ровно в обычное тело."""
+
+import gzip
+import random
+import zlib
+
+import pytest
+
+import app
+from app import CONFIG, IndexPage
+
+SCORES = [0, 7, -1, 10 ** 6, -(10 ** 18), 2 ** 70]
+
+
+@pytest.mark.parametrize("score", SCORES)
+def test_gzip_body_real_page(score):
+    page = CONFIG.index_page
+    assert gzip.decompress(page.gzip_body(score)) == page.body(score)
+
+
+@pytest.mark.parametrize("head_len,tail_len", [(0, 0), (1, 0), (0, 1), (100_000, 3), (5, 200_000)])
+def test_gzip_body_edges(head_len, tail_len):
+    rng = random.Random(head_len * 7 + tail_len)
+    # и сжимаемый текст, и случайные байты больше окна deflate
+    head = "".join(rng.choice("ab<>ж ") for _ in range(head_len))
+    tail = "".join(chr(rng.randrange(32, 0x2FF)) for _ in range(tail_len))
+    page = IndexPage(head + IndexPage.SCORE_MARKER + tail)
+    for score in SCORES:
+        data = page.gzip_body(score)
+        assert gzip.decompress(data) == page.body(score)
+        # строгая проверка: ровно один gzip-член, без мусора после него
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        assert d.decompress(data) == page.body(score)
+        assert d.eof and not d.unused_data
+
+
+def test_index_route_gzip():
+    client = app.app.test_client()
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    packed = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(packed.data) == plain.data
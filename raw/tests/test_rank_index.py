@@ -0,0 +1,73 @@
+"""RankIndex против отсортированного списка на случайных операциях."""
+
+import random
+from bisect import insort
+
+import pytest
+
+from leaderboard import RankIndex
+
+
+def _check(index: RankIndex, ref: list, rng: random.Random) -> None:
+    assert len(index) == len(ref)
+    assert index.slice(0, len(ref) + 1) == ref
+    for key in rng.sample(ref, min(len(ref), 20)):
+        assert index.rank(key) == ref.index(key)
+    for _ in range(10):
+        start = rng.randrange(-3, len(ref) + 3)
+        count = rng.randrange(0, 12)
+        assert index.slice(start, count) == ref[max(start, 0):max(start + count, 0)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_operations(seed):
+    rng = random.Random(seed)
+    index = RankIndex(seed)
+    ref: list = []
+    live: dict = {}
+    for step in range(3000):
+        sid = f"p{rng.randrange(400)}"
+        if sid in live and rng.random() < 0.3:
+            key = live.pop(sid)
+            index.remove(key)
+            ref.remove(key)
+        else:
+            # как Leaderboard: смена счета - удалить старый ключ и вставить новый
+            if sid in live:
+                index.remove(live[sid])
+                ref.remove(live[sid])
+            key = (-rng.randrange(1000), sid)
+            live[sid] = key
+            index.insert(key)
+            insort(ref, key)
+        if step % 250 == 0:
+            _check(index, ref, rng)
+    _check(index, ref, rng)
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 1000])
+def test_build_then_update(n):
+    rng = random.Random(n)
+    ref = sorted((-rng.randrange(500), f"p{i}") for i in range(n))
+    index = RankIndex(n)
+    index.build(ref)
+    _check(index, ref, rng)
+    for i in range(200):
+        key = (-rng.randrange(500), f"q{i}")
+        index.insert(key)
+        insort(ref, key)
+        if ref and rng.random() < 0.5:
+            old = ref.pop(rng.randrange(len(ref)))
+            index.remove(old)
+    _check(index, ref, rng)
+
+
+def test_missing_key():
+    index = RankIndex(0)
+    index.insert((-5, "a"))
+    with pytest.raises(KeyError):
+        index.rank((-5, "b"))
+    with pytest.raises(KeyError):
+        index.remove((-4, "a"))
+    with pytest.raises(ValueError):
+        index.build([(-1, "x")])